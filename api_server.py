@@ -4,22 +4,56 @@ Local API server for testing the React frontend with the Lambda function.
 Run this to test your frontend without deploying to AWS.
 """
 
+import atexit
+import logging
 import os
+import queue
 import sys
-import json
+import orjson
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 
-# Add backend to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+# Import the backend as the `backend.` package, the same path the document
+# processor uses, so there is one copy of each module (and one
+# OpenSearchClient document store) in the process
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from lambda_functions.document_processor import lambda_handler
-from clients.session_manager import session_manager
-from clients.chat_handler import ChatHandler
+def configure_logging():
+    """
+    Route log records through a queue so request threads never block on stdout.
+    
+    Handlers enqueue the record and return; a QueueListener thread does the
+    formatting and writing. LOG_LEVEL controls verbosity (default INFO).
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    root = logging.getLogger()
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    root.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+from backend.lambda_functions.document_processor import handle_document_request
+from backend.clients.session_manager import session_manager
+from backend.clients.chat_handler import ChatHandler
+from backend.clients.opensearch_client import OpenSearchClient
 
-app = FastAPI(title="Invoice Processor API", version="1.0.0")
+# ORJSONResponse serializes every JSON response with orjson instead of stdlib json
+app = FastAPI(title="Invoice Processor API", version="1.0.0", default_response_class=ORJSONResponse)
+opensearch_client = OpenSearchClient()
+# Stateless apart from its clients, so one instance serves every chat request
+chat_handler = ChatHandler()
 
 # Enable CORS for React frontend
 app.add_middleware(
@@ -38,8 +72,14 @@ class DocumentRequest(BaseModel):
 class S3DocumentRequest(BaseModel):
     s3_key: str
     bucket_name: Optional[str] = None
+    file_name: Optional[str] = None
+    session_id: Optional[str] = None
     document_type: str = "invoice"
 
+class PresignRequest(BaseModel):
+    file_name: str
+    content_type: str = "application/pdf"
+
 class CreateSessionRequest(BaseModel):
     invoices: List[dict]
 
@@ -55,81 +95,80 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "invoice-processor"}
 
+# Handlers that block on Bedrock/S3 or TF-IDF work are plain `def` so FastAPI
+# runs them in its threadpool instead of stalling the event loop.
 @app.post("/process-document")
-async def process_document(request: DocumentRequest):
+def process_document(request: DocumentRequest):
     """Process a document using the Lambda function."""
     try:
-        print(f"🔍 Processing document: {request.file_name}")
+        logger.info("🔍 Processing document: %s", request.file_name)
         
-        # Create Lambda event format
-        event = {
-            "body": json.dumps({
-                "file_data": request.file_data,
-                "file_name": request.file_name,
-                "document_type": request.document_type
-            })
-        }
+        # Call the Lambda's request handler in-process; it takes and returns
+        # plain dicts, so nothing is serialized to JSON and parsed back
+        logger.debug("📝 Calling document processor...")
+        status_code, response_body = handle_document_request({
+            "file_data": request.file_data,
+            "file_name": request.file_name,
+            "document_type": request.document_type
+        })
+        logger.info("✅ Lambda result status: %s", status_code)
         
-        print("📝 Calling lambda_handler...")
-        # Call the Lambda handler
-        result = lambda_handler(event, None)
-        print(f"✅ Lambda result status: {result.get('statusCode', 'unknown')}")
-        
-        # Parse the Lambda response
-        if result["statusCode"] == 200:
-            response_body = json.loads(result["body"])
-            print("🎉 Processing successful")
+        if status_code == 200:
+            logger.debug("🎉 Processing successful")
             return response_body
         else:
-            error_body = json.loads(result["body"])
-            error_msg = error_body.get("error", "Processing failed")
-            print(f"❌ Processing failed: {error_msg}")
+            error_msg = response_body.get("error", "Processing failed")
+            logger.warning("❌ Processing failed: %s", error_msg)
             raise HTTPException(
-                status_code=result["statusCode"],
+                status_code=status_code,
                 detail=error_msg
             )
             
     except Exception as e:
-        print(f"💥 Exception in API: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("💥 Exception in API: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/process-s3-document")
-async def process_s3_document(request: S3DocumentRequest):
+def process_s3_document(request: S3DocumentRequest):
     """Process a document from S3 using the Lambda function."""
     try:
-        # Create Lambda event format
-        event = {
-            "body": json.dumps({
-                "s3_key": request.s3_key,
-                "bucket_name": request.bucket_name,
-                "document_type": request.document_type
-            })
-        }
+        status_code, response_body = handle_document_request({
+            "s3_key": request.s3_key,
+            "bucket_name": request.bucket_name,
+            "file_name": request.file_name,
+            "session_id": request.session_id,
+            "document_type": request.document_type
+        })
         
-        # Call the Lambda handler
-        result = lambda_handler(event, None)
-        
-        # Parse the Lambda response
-        if result["statusCode"] == 200:
-            response_body = json.loads(result["body"])
+        if status_code == 200:
             return response_body
         else:
-            error_body = json.loads(result["body"])
             raise HTTPException(
-                status_code=result["statusCode"],
-                detail=error_body.get("error", "Processing failed")
+                status_code=status_code,
+                detail=response_body.get("error", "Processing failed")
             )
             
+    except HTTPException:
+        # Keep the processor's status (e.g. 403 for a disallowed bucket or key)
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/presign-upload")
+def presign_upload(request: PresignRequest):
+    """Get a presigned S3 PUT URL so the browser can upload without going through the API."""
+    result = opensearch_client.generate_upload_url(request.file_name, request.content_type)
+    
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+    
+    return result
+
 @app.post("/create-session")
-async def create_session(request: CreateSessionRequest):
+def create_session(request: CreateSessionRequest):
     """Create a new chat session with invoice data."""
     try:
-        print(f"🎯 Creating session with {len(request.invoices)} invoices")
+        logger.info("🎯 Creating session with %d invoices", len(request.invoices))
         
         # Create session with embeddings
         session_id = session_manager.create_session(request.invoices)
@@ -142,47 +181,57 @@ async def create_session(request: CreateSessionRequest):
         }
         
     except Exception as e:
-        print(f"💥 Session creation error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("💥 Session creation error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat")
-async def chat_with_invoices(request: ChatRequest):
+def chat_with_invoices(request: ChatRequest):
     """Chat about invoices in a specific session."""
     try:
-        print(f"💬 Chat request for session {request.session_id}: {request.message}")
+        logger.info("💬 Chat request for session %s: %s", request.session_id, request.message)
         
         # Get session data
         session_data = session_manager.get_session(request.session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found or expired")
         
-        # Initialize chat handler
-        chat_handler = ChatHandler()
-        
-        # Process the chat message
-        result = chat_handler.handle_chat(request.message, session_data)
+        # Process the chat message; documents are indexed by session ID
+        result = chat_handler.handle_chat(request.message, request.session_id)
         
         if result.get("success"):
-            print(f"✅ Chat response generated")
+            logger.debug("✅ Chat response generated")
             return {
                 "success": True,
                 "response": result["response"],
                 "session_id": request.session_id
             }
         else:
-            print(f"❌ Chat error: {result.get('error')}")
+            logger.warning("❌ Chat error: %s", result.get('error'))
             raise HTTPException(status_code=500, detail=result.get("error"))
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"💥 Chat error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("💥 Chat error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+def chat_stream(request: ChatRequest):
+    """Stream a chat reply as server-sent events while Claude generates it."""
+    if not session_manager.get_session(request.session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    
+    def event_stream():
+        try:
+            for chunk in chat_handler.stream_chat(request.message, request.session_id):
+                yield f"data: {orjson.dumps({'text': chunk}).decode()}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.exception("💥 Chat stream error: %s", e)
+            yield f"event: error\ndata: {orjson.dumps({'error': str(e)}).decode()}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/session/{session_id}/status")
 async def get_session_status(session_id: str):
     """Get status of a specific session."""
@@ -0,0 +1,66 @@
+import threading
+from typing import Any, Dict, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+DEFAULT_REGION = "us-west-2"
+
+# Shared client configuration: a larger connection pool so concurrent requests
+# don't queue on the pool, adaptive retries for throttling, TCP keepalive so
+# idle TLS connections to S3/Bedrock stay warm between requests, and a short
+# connect timeout so an unreachable endpoint fails fast instead of hanging.
+CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    retries={"max_attempts": 3, "mode": "adaptive"},
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=60
+)
+
+# Per-service overrides on top of CLIENT_CONFIG. Bedrock model calls can
+# generate for well over a minute on long documents, and a read timeout
+# there would throw away a response that was nearly done.
+SERVICE_CONFIGS = {
+    "bedrock-runtime": CLIENT_CONFIG.merge(Config(read_timeout=120))
+}
+
+# S3 transfers above 8 MB are split into parts uploaded/downloaded in parallel
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
+
+_session = boto3.Session()
+_clients: Dict[Tuple[str, str], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service_name: str, region_name: str = DEFAULT_REGION):
+    """
+    Get a process-wide boto3 client for a service and region.
+
+    boto3 clients are thread-safe, so a single instance is reused by every
+    caller. This skips credential resolution and client construction on each
+    request and lets calls share the underlying HTTPS connection pool.
+
+    Args:
+        service_name: AWS service name (e.g. "s3", "bedrock-runtime")
+        region_name: AWS region for the client
+
+    Returns:
+        Shared boto3 client
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                config = SERVICE_CONFIGS.get(service_name, CLIENT_CONFIG)
+                client = _session.client(service_name, region_name=region_name, config=config)
+                _clients[key] = client
+    return client
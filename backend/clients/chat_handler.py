@@ -1,8 +1,12 @@
-import json
-from typing import Dict, List, Any, Optional
+import logging
+from typing import Dict, Iterator, List, Any, Optional
 from .opensearch_client import OpenSearchClient
 from .claude_client import ClaudeClient
 
+logger = logging.getLogger(__name__)
+
+NO_DOCUMENTS_RESPONSE = "I don't have any documents uploaded yet. Please upload some invoices first and I'll be happy to help analyze them!"
+
 class ChatHandler:
     def __init__(self):
         self.opensearch_client = OpenSearchClient()
@@ -11,8 +15,8 @@ class ChatHandler:
     def handle_chat(self, message: str, session_id: str) -> Dict[str, Any]:
         """Handle a chat message using OpenSearch semantic search."""
         try:
-            print(f"DEBUG: Searching for '{message}' in session '{session_id}'")
-            print(f"DEBUG: Total documents in store: {len(self.opensearch_client.documents)}")
+            logger.debug("Searching for '%s' in session '%s'", message, session_id)
+            logger.debug("Total documents in store: %d", len(self.opensearch_client.documents))
             
             # Perform semantic search
             search_result = self.opensearch_client.semantic_search(message, session_id, limit=3)
@@ -28,116 +32,138 @@ class ChatHandler:
             if not search_result['results']:
                 return {
                     'success': True,
-                    'response': "I don't have any documents uploaded yet. Please upload some invoices first and I'll be happy to help analyze them!",
+                    'response': NO_DOCUMENTS_RESPONSE,
                     'session_id': session_id
                 }
             
-            # Build concise context from search results
-            context_parts = []
-            for result in search_result['results']:
-                if result['structured_data']:
-                    vendor = result['structured_data'].get('vendor_name', 'Unknown vendor')
-                    amount = result['structured_data'].get('total_amount', 'Unknown amount')
-                    invoice_num = result['structured_data'].get('invoice_number', '')
-                    date = result['structured_data'].get('date', '')
-                    line_items = result['structured_data'].get('line_items', [])
-                    
-                    doc_info = f"Document: {result['filename']} - Vendor: {vendor}, Amount: ${amount}"
-                    if invoice_num:
-                        doc_info += f", Invoice: {invoice_num}"
-                    if date:
-                        doc_info += f", Date: {date}"
-                    
-                    # Add detailed line items if available
-                    if line_items and isinstance(line_items, list):
-                        doc_info += f"\nLine Items ({len(line_items)} items):"
-                        for i, item in enumerate(line_items):
-                            if isinstance(item, dict):
-                                desc = item.get('description', 'Unknown')
-                                qty = item.get('quantity', '')
-                                rate = item.get('rate', '')
-                                item_amount = item.get('amount', '')
-                                
-                                line_detail = f"\n  {i+1}. {desc}"
-                                if qty: line_detail += f" - Quantity: {qty}"
-                                if rate: line_detail += f" - Rate: ${rate}"
-                                if item_amount: line_detail += f" - Amount: ${item_amount}"
-                                
-                                doc_info += line_detail
-                    
-                    context_parts.append(doc_info)
-            
-            context = "Invoice data:\n" + "\n".join(context_parts)
+            conversation_prompt = self._build_conversation_prompt(message, search_result['results'])
             
-            # Create a natural conversation prompt
-            conversation_prompt = f"""You are a helpful assistant analyzing invoices. Based on the invoice data below, answer the user's question naturally and conversationally. Be brief and direct - no numbered lists or formal structure. Just answer like you're having a conversation.
-
-{context}
-
-User question: {message}
-
-Provide a natural, conversational response. If asked about "who charged the most" or similar, just say the vendor name and amount directly."""
-
             # Use Claude for natural conversation
             claude_response = self.claude_client.chat_with_streaming(conversation_prompt)
             
+            sources = [{'filename': r['filename'], 'similarity': r['similarity_score']} for r in search_result['results']]
+            
             if claude_response.get('success'):
                 return {
                     'success': True,
                     'response': claude_response['response'],
-                    'sources': [{'filename': r['filename'], 'similarity': r['similarity_score']} for r in search_result['results']],
+                    'sources': sources,
                     'session_id': session_id
                 }
-            else:
-                # Simple fallback based on the question
-                if 'vendor' in message.lower() and ('most' in message.lower() or 'highest' in message.lower() or 'charged' in message.lower()):
-                    # Find the highest amount
-                    highest_amount = 0
-                    highest_vendor = "Unknown"
-                    
-                    for result in search_result['results']:
-                        amount = result['structured_data'].get('total_amount', 0)
-                        vendor = result['structured_data'].get('vendor_name', 'Unknown')
-                        if isinstance(amount, (int, float)) and amount > highest_amount:
-                            highest_amount = amount
-                            highest_vendor = vendor
-                    
-                    if highest_amount > 0:
-                        response = f"{highest_vendor} charged the most at ${highest_amount:,.2f}."
-                    else:
-                        response = "I couldn't determine which vendor charged the most from the available data."
-                    
-                    return {
-                        'success': True,
-                        'response': response,
-                        'sources': [{'filename': r['filename'], 'similarity': r['similarity_score']} for r in search_result['results']],
-                        'session_id': session_id
-                    }
+            
+            # Simple fallback based on the question
+            message_lower = message.lower()
+            if 'vendor' in message_lower and ('most' in message_lower or 'highest' in message_lower or 'charged' in message_lower):
+                highest_vendor, highest_amount = self._find_highest_vendor(search_result['results'])
                 
-                # Generic response with basic info
-                if search_result['results']:
-                    result = search_result['results'][0]
-                    vendor = result['structured_data'].get('vendor_name', 'Unknown vendor')
-                    amount = result['structured_data'].get('total_amount', 'Unknown amount')
-                    response = f"I found an invoice from {vendor} for ${amount}."
+                if highest_amount > 0:
+                    response = f"{highest_vendor} charged the most at ${highest_amount:,.2f}."
                 else:
-                    response = "I found some documents but couldn't extract the specific information you're looking for."
-                
-                return {
-                    'success': True,
-                    'response': response,
-                    'sources': [{'filename': r['filename'], 'similarity': r['similarity_score']} for r in search_result['results']],
-                    'session_id': session_id
-                }
+                    response = "I couldn't determine which vendor charged the most from the available data."
+            else:
+                # Generic response with basic info
+                data = search_result['results'][0]['structured_data']
+                vendor = data.get('vendor_name', 'Unknown vendor')
+                amount = data.get('total_amount', 'Unknown amount')
+                response = f"I found an invoice from {vendor} for ${amount}."
+            
+            return {
+                'success': True,
+                'response': response,
+                'sources': sources,
+                'session_id': session_id
+            }
             
         except Exception as e:
-            print(f"Chat error: {e}")
+            logger.exception("Chat error: %s", e)
             return {
                 'success': False,
                 'error': f"Chat processing failed: {str(e)}",
                 'session_id': session_id
             }
     
+    def _build_conversation_prompt(self, message: str, results: List[Dict[str, Any]]) -> str:
+        """Build the Claude chat prompt from the top search results."""
+        # Build concise context from search results
+        context_parts = []
+        for result in results:
+            data = result['structured_data']
+            if data:
+                vendor = data.get('vendor_name', 'Unknown vendor')
+                amount = data.get('total_amount', 'Unknown amount')
+                invoice_num = data.get('invoice_number', '')
+                date = data.get('date', '')
+                line_items = data.get('line_items', [])
+                
+                # Collect fragments and join once; repeated += re-copies the growing string
+                doc_parts = [f"Document: {result['filename']} - Vendor: {vendor}, Amount: ${amount}"]
+                if invoice_num:
+                    doc_parts.append(f", Invoice: {invoice_num}")
+                if date:
+                    doc_parts.append(f", Date: {date}")
+                
+                # Add detailed line items if available
+                if line_items and isinstance(line_items, list):
+                    doc_parts.append(f"\nLine Items ({len(line_items)} items):")
+                    for i, item in enumerate(line_items, 1):
+                        if isinstance(item, dict):
+                            doc_parts.append(f"\n  {i}. {item.get('description', 'Unknown')}")
+                            
+                            qty = item.get('quantity')
+                            rate = item.get('rate')
+                            item_amount = item.get('amount')
+                            if qty: doc_parts.append(f" - Quantity: {qty}")
+                            if rate: doc_parts.append(f" - Rate: ${rate}")
+                            if item_amount: doc_parts.append(f" - Amount: ${item_amount}")
+                
+                context_parts.append("".join(doc_parts))
+        
+        context = "Invoice data:\n" + "\n".join(context_parts)
+        
+        # Create a natural conversation prompt
+        conversation_prompt = f"""You are a helpful assistant analyzing invoices. Based on the invoice data below, answer the user's question naturally and conversationally. Be brief and direct - no numbered lists or formal structure. Just answer like you're having a conversation.
+
+{context}
+
+User question: {message}
+
+Provide a natural, conversational response. If asked about "who charged the most" or similar, just say the vendor name and amount directly."""
+        
+        return conversation_prompt
+    
+    def stream_chat(self, message: str, session_id: str) -> Iterator[str]:
+        """
+        Stream the chat reply for a message as text chunks.
+        
+        Same search and prompt as handle_chat, but the Claude reply is yielded
+        token by token so callers can forward it (e.g. over SSE) as it arrives.
+        """
+        search_result = self.opensearch_client.semantic_search(message, session_id, limit=3)
+        
+        if not search_result['success']:
+            raise RuntimeError(search_result['error'])
+        
+        if not search_result['results']:
+            yield NO_DOCUMENTS_RESPONSE
+            return
+        
+        conversation_prompt = self._build_conversation_prompt(message, search_result['results'])
+        yield from self.claude_client.stream_chat(conversation_prompt)
+    
+    def _find_highest_vendor(self, results: List[Dict[str, Any]]):
+        """Return (vendor, amount) for the search result with the largest total."""
+        highest_amount = 0
+        highest_vendor = "Unknown"
+        
+        for result in results:
+            data = result['structured_data']
+            amount = data.get('total_amount', 0)
+            if isinstance(amount, (int, float)) and amount > highest_amount:
+                highest_amount = amount
+                highest_vendor = data.get('vendor_name', 'Unknown')
+        
+        return highest_vendor, highest_amount
+    
     def handle_aggregation_query(self, message: str, session_id: str) -> Dict[str, Any]:
         """Handle queries that require aggregation across documents."""
         try:
@@ -1,22 +1,151 @@
-import boto3
-import json
+import copy
+import hashlib
+import logging
 import os
-from typing import Dict, Any, List
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+import orjson
+from .aws_clients import get_client
+from .llm_cache import LLMCache
+from .rule_extractor import RuleExtractor
+
+logger = logging.getLogger(__name__)
+
+# Bedrock responses for deterministic (low-temperature) calls, shared by all clients
+_RESPONSE_CACHE_SIZE = 1024
+# (raw response bytes, parsed per hit so callers never share a mutable dict)
+_response_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# Nova Lite calls per document when its reply isn't valid JSON (first try + retries)
+_NOVA_PARSE_ATTEMPTS = 3
+
+# Sonnet extraction instructions. Kept ahead of the document text and marked
+# with cache_control so repeat calls reuse the cached prefix; Anthropic only
+# caches prefixes above the model's minimum length (1024 tokens for Sonnet),
+# so growing these instructions past it is what turns caching on.
+_SONNET_INSTRUCTIONS = """You are an expert at extracting structured data from complex {document_type} documents, especially legal invoices with detailed time entries.
+
+Analyze the document text that follows these instructions and extract comprehensive billing information.
+
+Extract the following information:
+
+1. BASIC INFORMATION:
+   - vendor_name: The law firm or company name (look for "LLP", "LLC", firm letterhead)
+   - invoice_number: Invoice/matter number
+   - total_amount: Final total amount due (extract the number from "Total Amount Due", "Total", etc.)
+   - date: Invoice date in YYYY-MM-DD format
+   - payment_terms: Payment terms (e.g., "Net 30", "Payable in 90 days")
+
+2. DETAILED LINE ITEMS:
+   For legal invoices, extract time entries, rate summaries, and disbursements:
+   - Each time entry with date, attorney name, description, hours worked
+   - Rate summaries showing attorney name, total hours, hourly rate, total amount
+   - Any disbursements or additional costs
+
+3. ATTORNEY INFORMATION:
+   - Extract individual attorney details: name, hours worked, hourly rate, total billed
+
+Be thorough in extracting time entries and attorney billing details. {output_instruction}"""
+
+_SINGLE_DOCUMENT_OUTPUT = "Report the results by calling the emit_invoice tool."
+_BATCH_DOCUMENT_OUTPUT = (
+    "Several documents follow, each wrapped in <doc id=\"N\"> tags. Report them by calling the "
+    "emit_invoices tool once, with one entry per document carrying its doc_id."
+)
+
+# Documents packed into one Sonnet call by format_batch, and the output budget per document
+SONNET_BATCH_SIZE = 5
+_SONNET_TOKENS_PER_DOCUMENT = 2000
+_SONNET_MAX_OUTPUT_TOKENS = 8192
+
+# Schema for Sonnet's extraction output. Forcing a call to this tool makes the
+# model return its answer as a tool_use input that is already parsed JSON.
+INVOICE_TOOL = {
+    "name": "emit_invoice",
+    "description": "Record the structured billing data extracted from the document.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "vendor_name": {"type": "string", "description": "Law firm or company name"},
+            "invoice_number": {"type": "string", "description": "Invoice or matter number"},
+            "total_amount": {"type": "number", "description": "Final total amount due"},
+            "date": {"type": "string", "description": "Invoice date as YYYY-MM-DD"},
+            "payment_terms": {"type": "string", "description": "Payment terms, e.g. Net 30"},
+            "line_items": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "description": {"type": "string"},
+                        "quantity": {"type": "number", "description": "Hours or units"},
+                        "rate": {"type": "number", "description": "Hourly rate or unit price"},
+                        "amount": {"type": "number", "description": "Line total"},
+                        "person": {"type": "string", "description": "Attorney or person name"},
+                        "date": {"type": "string", "description": "Entry date as YYYY-MM-DD"}
+                    },
+                    "required": ["description", "amount"]
+                }
+            }
+        },
+        "required": ["vendor_name", "invoice_number", "total_amount", "date", "line_items"]
+    }
+}
+
+# Same schema for several documents at once, each entry tagged with its doc_id
+INVOICE_BATCH_TOOL = {
+    "name": "emit_invoices",
+    "description": "Record the structured billing data extracted from each document.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "invoices": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "doc_id": {"type": "integer", "description": "id attribute of the document's <doc> tag"},
+                        **INVOICE_TOOL["input_schema"]["properties"]
+                    },
+                    "required": ["doc_id"] + INVOICE_TOOL["input_schema"]["required"]
+                }
+            }
+        },
+        "required": ["invoices"]
+    }
+}
 
 class ClaudeClient:
     def __init__(self, region_name: str = "us-west-2"):
         """Initialize Claude client for chat interactions."""
-        # Ensure we use the current AWS profile/credentials from environment
-        session = boto3.Session()
-        self.client = session.client("bedrock-runtime", region_name=region_name)
+        # Shared bedrock-runtime client so every ClaudeClient reuses the same connection pool
+        self.client = get_client("bedrock-runtime", region_name)
         self.chat_model_id = "anthropic.claude-3-haiku-20240307-v1:0"  # Claude for chat
         self.formatting_model_id = "us.amazon.nova-lite-v1:0"  # Nova Lite inference profile for formatting
         self.fallback_model_id = "anthropic.claude-3-5-sonnet-20241022-v2:0"  # Claude 3.5 Sonnet fallback for complex documents
+        self.rule_extractor = RuleExtractor()
+        self.llm_cache = LLMCache()
     
     def format_extracted_text(self, raw_text: str, document_type: str = "invoice") -> Dict[str, Any]:
         """
         Use Nova Lite to format raw text into structured data, with Claude 3.5 Sonnet fallback.
         
+        A regex pass runs first; the header fields it finds are given to Nova
+        Lite as hints and fill any field the model leaves empty. Successful
+        model results are kept in the on-disk LLMCache (when enabled) so
+        identical text is never sent twice.
+        
+        If Nova Lite's first reply can't be parsed, the Sonnet call is started
+        in the background while Nova Lite retries, so a document that ends up
+        on Sonnet doesn't pay for the retries and Sonnet back to back. Nova
+        Lite's result is still preferred when a retry succeeds; the Sonnet call
+        has already started by then and isn't stopped, so that case costs one
+        unused Sonnet call. The speculative call gets its own thread per
+        request, so it never queues behind other requests' speculative calls.
+        
         Args:
             raw_text: Raw text from text extraction
             document_type: Type of document (invoice, receipt, etc.)
@@ -24,47 +153,160 @@ class ClaudeClient:
         Returns:
             Dictionary with structured data or error information
         """
+        try:
+            speculative_executor = None
+            sonnet_future = None
+            
+            def start_sonnet():
+                nonlocal speculative_executor, sonnet_future
+                speculative_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sonnet-speculative")
+                sonnet_future = speculative_executor.submit(self._try_sonnet_extraction, raw_text, document_type)
+            
+            try:
+                result, rule_fields, cache_key = self._format_without_sonnet(raw_text, document_type, on_nova_retry=start_sonnet)
+                if result is not None:
+                    # A Nova Lite retry won; the Sonnet call is already running
+                    # and finishes (and is billed) on its own thread, unused
+                    return result
+                
+                # Fallback: Claude 3.5 Sonnet (more powerful)
+                if sonnet_future is not None:
+                    sonnet_result = sonnet_future.result()
+                else:
+                    sonnet_result = self._try_sonnet_extraction(raw_text, document_type)
+                return self._finish_with_sonnet(raw_text, sonnet_result, rule_fields, cache_key)
+            finally:
+                if speculative_executor is not None:
+                    # Don't wait for a discarded call; its thread exits when it returns
+                    speculative_executor.shutdown(wait=False)
+                
+        except Exception as e:
+            logger.exception("Extraction error: %s", e)
+            return self._fallback_extraction(raw_text)
+    
+    def format_batch(self, texts: List[str], document_type: str = "invoice", max_workers: int = 8) -> List[Dict[str, Any]]:
+        """
+        Format several documents' raw text (bulk processing).
+        
+        Rules, cache and Nova Lite run per document, concurrently so Bedrock
+        round-trips overlap. Documents that still need Sonnet are then packed
+        SONNET_BATCH_SIZE to a call, sharing the instruction prefix and the
+        per-request overhead. Results keep the same order as texts.
+        
+        Args:
+            texts: Raw text of each document
+            document_type: Type of document (invoice, receipt, etc.)
+            max_workers: Maximum number of Bedrock calls in flight at once
+            
+        Returns:
+            List of structured data results
+        """
+        if len(texts) <= 1:
+            return [self.format_extracted_text(text, document_type) for text in texts]
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as executor:
+            first_pass = list(executor.map(lambda text: self._format_without_sonnet(text, document_type), texts))
+            results = [result for result, _, _ in first_pass]
+            
+            pending = [i for i, result in enumerate(results) if result is None]
+            groups = [pending[start:start + SONNET_BATCH_SIZE] for start in range(0, len(pending), SONNET_BATCH_SIZE)]
+            group_results = executor.map(
+                lambda group: self._try_sonnet_batch_extraction([texts[i] for i in group], document_type),
+                groups
+            )
+            
+            for group, sonnet_results in zip(groups, group_results):
+                for i, sonnet_result in zip(group, sonnet_results):
+                    _, rule_fields, cache_key = first_pass[i]
+                    results[i] = self._finish_with_sonnet(texts[i], sonnet_result, rule_fields, cache_key)
+        
+        return results
+    
+    def _format_without_sonnet(self, raw_text: str, document_type: str,
+                               on_nova_retry: Optional[Callable[[], None]] = None) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], Optional[str]]:
+        """
+        Run every extraction stage short of Sonnet: rules, the LLM cache, then Nova Lite.
+        
+        Args:
+            on_nova_retry: Called once if Nova Lite's first reply can't be parsed
+        
+        Returns:
+            (result, rule_fields, cache_key); result is None when the document
+            still needs the Sonnet fallback
+        """
         try:
             if not raw_text or len(raw_text.strip()) < 10:
-                return {"error": "Insufficient text content for processing"}
+                return {"error": "Insufficient text content for processing"}, {}, None
+            
+            # Rule-based header fields: passed to Nova Lite as hints and used to
+            # fill anything the models leave empty
+            rule_fields = self.rule_extractor.extract_fields(raw_text)
+            
+            # Results from an earlier run on the same text
+            cache_models = f"{self.formatting_model_id}|{self.fallback_model_id}"
+            cache_key = self.llm_cache.make_key(cache_models, document_type, raw_text)
+            cached_result = self.llm_cache.get(cache_key)
+            if cached_result is not None:
+                logger.debug("Using cached model extraction")
+                return cached_result, rule_fields, cache_key
             
             # First attempt: Nova Lite (cost-effective)
-            print("Attempting extraction with Nova Lite...")
-            nova_result = self._try_nova_lite_extraction(raw_text, document_type)
+            logger.debug("Attempting extraction with Nova Lite")
+            nova_result = self._try_nova_lite_extraction(raw_text, document_type, on_nova_retry, rule_fields)
             
             # Check if Nova Lite succeeded
             if self._is_extraction_successful(nova_result):
-                print("✅ Nova Lite extraction successful")
+                logger.debug("Nova Lite extraction successful")
                 nova_result['model_used'] = 'nova-lite'
-                return nova_result
+                result = self._fill_missing_fields(nova_result, rule_fields)
+                self.llm_cache.set(cache_key, self.formatting_model_id, result)
+                return result, rule_fields, cache_key
             
-            # Fallback: Claude 3.5 Sonnet (more powerful)
-            print("❌ Nova Lite failed, falling back to Claude 3.5 Sonnet...")
-            sonnet_result = self._try_sonnet_extraction(raw_text, document_type)
+            logger.debug("Nova Lite failed (%s), falling back to Claude 3.5 Sonnet", nova_result.get('error', 'missing fields'))
+            return None, rule_fields, cache_key
             
-            if self._is_extraction_successful(sonnet_result):
-                print("✅ Claude 3.5 Sonnet extraction successful")
-                sonnet_result['model_used'] = 'claude-3.5-sonnet'
-                return sonnet_result
-            
-            # If both fail, use manual fallback
-            print("❌ Both models failed, using manual extraction...")
-            fallback_result = self._fallback_extraction(raw_text)
-            fallback_result['model_used'] = 'manual-fallback'
-            return fallback_result
-                
         except Exception as e:
-            print(f"Extraction error: {str(e)}")
-            return self._fallback_extraction(raw_text)
+            logger.exception("Extraction error: %s", e)
+            return self._fallback_extraction(raw_text), {}, None
     
-    def _try_nova_lite_extraction(self, raw_text: str, document_type: str) -> Dict[str, Any]:
-        """Try extraction with Nova Lite."""
+    def _finish_with_sonnet(self, raw_text: str, sonnet_result: Dict[str, Any],
+                            rule_fields: Dict[str, Any], cache_key: str) -> Dict[str, Any]:
+        """Accept a Sonnet result (filled in and cached) or fall back to manual extraction."""
+        if self._is_extraction_successful(sonnet_result):
+            logger.debug("Claude 3.5 Sonnet extraction successful")
+            sonnet_result['model_used'] = 'claude-3.5-sonnet'
+            result = self._fill_missing_fields(sonnet_result, rule_fields)
+            self.llm_cache.set(cache_key, self.fallback_model_id, result)
+            return result
+        
+        # If both fail, use manual fallback
+        logger.warning("Both models failed, using manual extraction")
+        fallback_result = self._fallback_extraction(raw_text, rule_fields)
+        fallback_result['model_used'] = 'manual-fallback'
+        return fallback_result
+    
+    def _try_nova_lite_extraction(self, raw_text: str, document_type: str,
+                                  on_retry: Optional[Callable[[], None]] = None,
+                                  hints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Try extraction with Nova Lite, calling on_retry before the first parse-error retry.
+        
+        hints are header fields the rule extractor already found; they are
+        shown to the model to check rather than taken as final.
+        """
         try:
+            hint_text = ""
+            if hints:
+                hint_text = (
+                    "\nPattern matching already found these values; use them unless the text shows they are wrong:\n"
+                    f"{orjson.dumps(hints).decode()}\n"
+                )
+            
             prompt = f"""You are extracting data from a {document_type}. Follow these steps:
 
 STEP 1: Find basic information in this text:
 {raw_text}
-
+{hint_text}
 STEP 2: Extract these required fields:
 - vendor_name: Look for law firm names (containing "LLP", "LLC") or company names at the top
 - invoice_number: Look for "Invoice Number:", "Matter Number:", or similar
@@ -105,37 +347,38 @@ STEP 4: Return ONLY this JSON structure:
 
 Extract what you can find. Return valid JSON only:"""
 
-            payload = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "text": prompt
-                            }
-                        ]
+            messages = [{"role": "user", "content": [{"text": prompt}]}]
+            
+            for attempt in range(_NOVA_PARSE_ATTEMPTS):
+                payload = {
+                    "messages": messages,
+                    "inferenceConfig": {
+                        "maxTokens": 1000,
+                        "temperature": 0.1
                     }
-                ],
-                "inferenceConfig": {
-                    "maxTokens": 1000,
-                    "temperature": 0.1
                 }
-            }
-            
-            response = self.client.invoke_model(
-                modelId=self.formatting_model_id,
-                body=json.dumps(payload)
-            )
-            
-            result = json.loads(response['body'].read())
-            
-            if 'output' in result and 'message' in result['output']:
-                content = result['output']['message'].get('content', [])
-                if content and len(content) > 0:
-                    response_text = content[0].get('text', '')
-                    return self._parse_json_response(response_text)
+                
+                result = self._invoke_model(self.formatting_model_id, payload)
+                
+                content = result.get('output', {}).get('message', {}).get('content', [])
+                response_text = content[0].get('text', '') if content else ''
+                if not response_text:
+                    return {"error": "Nova Lite: Invalid response format"}
+                
+                parsed = self._parse_json_response(response_text)
+                if 'error' not in parsed:
+                    return parsed
+                
+                if attempt == 0 and on_retry is not None:
+                    on_retry()
+                
+                # Show the model its own output and the parse error so the retry can correct it
+                messages = messages + [
+                    {"role": "assistant", "content": [{"text": response_text}]},
+                    {"role": "user", "content": [{"text": f"Your output could not be parsed ({parsed['error']}). Return only the JSON object, with no other text."}]}
+                ]
             
-            return {"error": "Nova Lite: Invalid response format"}
+            return parsed
             
         except Exception as e:
             return {"error": f"Nova Lite failed: {str(e)}"}
@@ -143,81 +386,99 @@ Extract what you can find. Return valid JSON only:"""
     def _try_sonnet_extraction(self, raw_text: str, document_type: str) -> Dict[str, Any]:
         """Try extraction with Claude 3.5 Sonnet for complex documents."""
         try:
-            prompt = f"""You are an expert at extracting structured data from complex {document_type} documents, especially legal invoices with detailed time entries.
-
-Analyze this text and extract comprehensive billing information:
-
-{raw_text}
-
-Extract the following information in JSON format:
-
-1. BASIC INFORMATION:
-   - vendor_name: The law firm or company name (look for "LLP", "LLC", firm letterhead)
-   - invoice_number: Invoice/matter number
-   - total_amount: Final total amount due (extract the number from "Total Amount Due", "Total", etc.)
-   - date: Invoice date in YYYY-MM-DD format
-   - payment_terms: Payment terms (e.g., "Net 30", "Payable in 90 days")
-
-2. DETAILED LINE ITEMS:
-   For legal invoices, extract time entries, rate summaries, and disbursements:
-   - Each time entry with date, attorney name, description, hours worked
-   - Rate summaries showing attorney name, total hours, hourly rate, total amount
-   - Any disbursements or additional costs
-
-3. ATTORNEY INFORMATION:
-   - Extract individual attorney details: name, hours worked, hourly rate, total billed
-
-Return ONLY valid JSON with this structure:
-{{
-  "vendor_name": "Law Firm Name",
-  "invoice_number": "12345",
-  "total_amount": 27531.83,
-  "date": "2023-04-18",
-  "payment_terms": "Payable in 90 days",
-  "line_items": [
-    {{
-      "description": "Legal services description",
-      "quantity": 2.5,
-      "rate": 1000.00,
-      "amount": 2500.00,
-      "person": "Attorney Name",
-      "date": "2023-03-08"
-    }}
-  ]
-}}
-
-Be thorough in extracting time entries and attorney billing details. Return valid JSON only:"""
-
-            payload = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 2000,
-                "temperature": 0.1,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-            
-            response = self.client.invoke_model(
-                modelId=self.fallback_model_id,
-                body=json.dumps(payload)
+            result = self._call_sonnet_tool(
+                document_type, f"Text to analyze:\n{raw_text}",
+                INVOICE_TOOL, _SINGLE_DOCUMENT_OUTPUT, _SONNET_TOKENS_PER_DOCUMENT
             )
+            if 'error' in result:
+                return result
             
-            result = json.loads(response['body'].read())
-            response_text = result['content'][0]['text']
-            
-            return self._parse_json_response(response_text)
+            result['confidence'] = 0.9
+            return result
             
         except Exception as e:
             return {"error": f"Claude 3.5 Sonnet failed: {str(e)}"}
     
+    def _try_sonnet_batch_extraction(self, raw_texts: List[str], document_type: str) -> List[Dict[str, Any]]:
+        """
+        Extract several documents with one Claude 3.5 Sonnet call.
+        
+        A document missing from the batch response is retried on its own, so
+        one skipped entry doesn't send it to the manual fallback.
+        """
+        if len(raw_texts) == 1:
+            return [self._try_sonnet_extraction(raw_texts[0], document_type)]
+        
+        try:
+            documents = "\n".join(f'<doc id="{doc_id}">\n{raw_text}\n</doc>' for doc_id, raw_text in enumerate(raw_texts))
+            max_tokens = min(_SONNET_TOKENS_PER_DOCUMENT * len(raw_texts), _SONNET_MAX_OUTPUT_TOKENS)
+            result = self._call_sonnet_tool(document_type, documents, INVOICE_BATCH_TOOL, _BATCH_DOCUMENT_OUTPUT, max_tokens)
+            if 'error' in result:
+                logger.debug("Sonnet batch call failed (%s), extracting documents one at a time", result['error'])
+                invoices = []
+            else:
+                invoices = result.get('invoices', [])
+        except Exception as e:
+            logger.debug("Sonnet batch call failed (%s), extracting documents one at a time", e)
+            invoices = []
+        
+        by_id = {}
+        for invoice in invoices:
+            doc_id = invoice.get('doc_id')
+            if isinstance(doc_id, int) and 0 <= doc_id < len(raw_texts):
+                fields = {key: value for key, value in invoice.items() if key != 'doc_id'}
+                fields['confidence'] = 0.9
+                by_id.setdefault(doc_id, fields)
+        
+        return [by_id[doc_id] if doc_id in by_id else self._try_sonnet_extraction(raw_text, document_type)
+                for doc_id, raw_text in enumerate(raw_texts)]
+    
+    def _call_sonnet_tool(self, document_type: str, document_text: str, tool: Dict[str, Any],
+                          output_instruction: str, max_tokens: int) -> Dict[str, Any]:
+        """Send the extraction instructions plus document text to Sonnet and return the forced tool's input."""
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    # Static per document type and tool, so Bedrock can serve it from the prompt cache
+                    {
+                        "type": "text",
+                        "text": _SONNET_INSTRUCTIONS.format(document_type=document_type, output_instruction=output_instruction),
+                        "cache_control": {"type": "ephemeral"}
+                    },
+                    {"type": "text", "text": document_text}
+                ]
+            }
+        ]
+        
+        result = self._call_claude_with_tools(
+            messages,
+            [tool],
+            max_tokens=max_tokens,
+            model_id=self.fallback_model_id,
+            tool_choice={"type": "tool", "name": tool["name"]}
+        )
+        if 'error' in result:
+            return result
+        
+        cache_read_tokens = result.get('usage', {}).get('cache_read_input_tokens', 0)
+        if cache_read_tokens:
+            logger.debug("Sonnet prompt cache hit: %d input tokens read from cache", cache_read_tokens)
+        
+        for block in result.get('content', []):
+            if block.get('type') == 'tool_use' and block.get('name') == tool["name"]:
+                # Deep copy: callers mutate the result, including nested invoices
+                return copy.deepcopy(block['input'])
+        
+        return {"error": f"Claude 3.5 Sonnet: No {tool['name']} tool call in response"}
+    
     def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
         """Parse JSON from model response."""
         try:
-            # Extract JSON from the response
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
+            json_text = self._slice_json_block(response_text)
             
-            if json_start != -1 and json_end > json_start:
-                json_text = response_text[json_start:json_end]
-                structured_data = json.loads(json_text)
+            if json_text is not None:
+                structured_data = orjson.loads(json_text)
                 
                 # Add confidence score
                 structured_data['confidence'] = 0.9
@@ -225,9 +486,29 @@ Be thorough in extracting time entries and attorney billing details. Return vali
             else:
                 return {"error": "No valid JSON found in response"}
                 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             return {"error": f"JSON parsing failed: {str(e)}"}
     
+    def _slice_json_block(self, response_text: str) -> Optional[str]:
+        """
+        Return the outermost {...} block of a model response, or None.
+        
+        Models often wrap JSON in ```json fences or leading prose; slicing from
+        the first '{' to the last '}' strips that without a failed parse first.
+        """
+        json_start = response_text.find('{')
+        json_end = response_text.rfind('}') + 1
+        if json_start != -1 and json_end > json_start:
+            return response_text[json_start:json_end]
+        return None
+    
+    def _fill_missing_fields(self, result: Dict[str, Any], rule_fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill fields the model left empty with values found by the rule extractor."""
+        for field, value in rule_fields.items():
+            if not result.get(field) or result.get(field) == 'Not found':
+                result[field] = value
+        return result
+    
     def _is_extraction_successful(self, result: Dict[str, Any]) -> bool:
         """Check if extraction was successful."""
         if 'error' in result:
@@ -240,55 +521,54 @@ Be thorough in extracting time entries and attorney billing details. Return vali
         # Consider successful if we have either vendor name or total amount
         return has_vendor or has_total
     
-    def _fallback_extraction(self, raw_text: str) -> Dict[str, Any]:
-        """Simple fallback extraction if Nova Lite fails."""
-        import re
+    def _fallback_extraction(self, raw_text: str, rule_fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Low-confidence result from the rule extractor when the models fail."""
+        return {**self.rule_extractor.fallback_fields(raw_text, rule_fields), "confidence": 0.3}
+    
+    def stream_chat(self, prompt: str, context: str = "") -> Iterator[str]:
+        """
+        Stream a conversational response from Claude Haiku.
         
-        extracted = {"confidence": 0.3}
+        Uses invoke_model_with_response_stream and yields text deltas as they
+        arrive, so the first tokens are available long before the full reply.
+        """
+        # Create a natural conversation prompt
+        full_prompt = f"{context}\n\nUser: {prompt}\n\nAssistant:"
         
-        # Simple regex patterns
-        amount_match = re.search(r'\$[\d,]+\.?\d*', raw_text)
-        if amount_match:
-            try:
-                amount_str = amount_match.group().replace('$', '').replace(',', '')
-                extracted['total_amount'] = float(amount_str)
-            except:
-                pass
+        payload = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 500,
+            "temperature": 0.7,
+            "messages": [
+                {
+                    "role": "user", 
+                    "content": full_prompt
+                }
+            ]
+        }
         
-        # Look for invoice numbers
-        invoice_match = re.search(r'(?:invoice|inv)[\s#:]*(\w+)', raw_text, re.IGNORECASE)
-        if invoice_match:
-            extracted['invoice_number'] = invoice_match.group(1)
+        response = self.client.invoke_model_with_response_stream(
+            modelId=self.chat_model_id,
+            body=orjson.dumps(payload)
+        )
         
-        return extracted
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            
+            data = orjson.loads(chunk['bytes'])
+            if data.get('type') == 'content_block_delta':
+                text = data.get('delta', {}).get('text')
+                if text:
+                    yield text
     
     def chat_with_streaming(self, prompt: str, context: str = "") -> Dict[str, Any]:
         """
         Generate a conversational response using Claude Haiku.
         """
         try:
-            # Create a natural conversation prompt
-            full_prompt = f"{context}\n\nUser: {prompt}\n\nAssistant:"
-            
-            payload = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 500,
-                "temperature": 0.7,
-                "messages": [
-                    {
-                        "role": "user", 
-                        "content": full_prompt
-                    }
-                ]
-            }
-            
-            response = self.client.invoke_model(
-                modelId=self.chat_model_id,
-                body=json.dumps(payload)
-            )
-            
-            result = json.loads(response['body'].read())
-            response_text = result['content'][0]['text']
+            response_text = "".join(self.stream_chat(prompt, context))
             
             return {
                 "success": True,
@@ -316,7 +596,7 @@ Be thorough in extracting time entries and attorney billing details. Return vali
         Please review this extracted data against the original text and provide validation.
         
         Extracted Data:
-        {json.dumps(extracted_data, indent=2)}
+        {orjson.dumps(extracted_data, default=str, option=orjson.OPT_INDENT_2).decode()}
         
         Original Text:
         {raw_text}
@@ -333,6 +613,46 @@ Be thorough in extracting time entries and attorney billing details. Return vali
         
         return self._call_claude(prompt)
     
+    def _invoke_model(self, model_id: str, payload: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Invoke a Bedrock model and return the parsed response body.
+        
+        Identical requests (same model and payload) are served from an in-process
+        LRU cache keyed on a hash of the request, so re-processing the same
+        document skips the Bedrock round-trip. The cache holds the raw response
+        bytes and every call parses its own copy, so a caller modifying the
+        result can't corrupt later hits.
+        
+        Args:
+            model_id: Bedrock model or inference profile ID
+            payload: Request body
+            use_cache: Whether to read/write the response cache
+            
+        Returns:
+            Parsed response body
+        """
+        body = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+        
+        if use_cache:
+            key = hashlib.blake2b(model_id.encode() + b"\n" + body, digest_size=16).hexdigest()
+            with _response_cache_lock:
+                cached = _response_cache.get(key)
+                if cached is not None:
+                    _response_cache.move_to_end(key)
+            if cached is not None:
+                return orjson.loads(cached)
+        
+        response = self.client.invoke_model(modelId=model_id, body=body)
+        response_body = response['body'].read()
+        
+        if use_cache:
+            with _response_cache_lock:
+                _response_cache[key] = response_body
+                if len(_response_cache) > _RESPONSE_CACHE_SIZE:
+                    _response_cache.popitem(last=False)
+        
+        return orjson.loads(response_body)
+    
     def _call_claude(self, message: str, max_tokens: int = 2000) -> Dict[str, Any]:
         """
         Internal method to call Claude and return parsed JSON.
@@ -352,30 +672,31 @@ Be thorough in extracting time entries and attorney billing details. Return vali
         }
         
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(payload)
-            )
-            
-            response_body = json.loads(response["body"].read())
+            response_body = self._invoke_model(self.chat_model_id, payload)
             claude_response = response_body["content"][0]["text"]
             
-            # Try to parse as JSON
-            try:
-                return json.loads(claude_response)
-            except json.JSONDecodeError:
-                # If JSON parsing fails, return raw text with error
-                return {
-                    "error": "Failed to parse JSON response",
-                    "raw_response": claude_response
-                }
+            # Parse the JSON block, ignoring any fences or prose around it
+            json_text = self._slice_json_block(claude_response)
+            if json_text is not None:
+                try:
+                    return orjson.loads(json_text)
+                except orjson.JSONDecodeError:
+                    pass
+            
+            # No parseable JSON, return raw text with error
+            return {
+                "error": "Failed to parse JSON response",
+                "raw_response": claude_response
+            }
                 
         except Exception as e:
             return {
                 "error": f"Claude API error: {str(e)}"
             }
     
-    def _call_claude_with_tools(self, messages: List[Dict], tools: List[Dict], max_tokens: int = 2000) -> Dict[str, Any]:
+    def _call_claude_with_tools(self, messages: List[Dict], tools: List[Dict], max_tokens: int = 2000,
+                                model_id: Optional[str] = None,
+                                tool_choice: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Call Claude with tool calling capabilities.
         
@@ -383,6 +704,8 @@ Be thorough in extracting time entries and attorney billing details. Return vali
             messages: Conversation messages
             tools: Available tools for Claude to use
             max_tokens: Maximum tokens to generate
+            model_id: Claude model to call (defaults to the chat model)
+            tool_choice: Optional tool_choice, e.g. {"type": "tool", "name": ...} to force a tool
             
         Returns:
             Claude response with potential tool calls
@@ -394,14 +717,11 @@ Be thorough in extracting time entries and attorney billing details. Return vali
             "tools": tools,
             "temperature": 0.1
         }
+        if tool_choice:
+            payload["tool_choice"] = tool_choice
         
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(payload)
-            )
-            
-            response_body = json.loads(response["body"].read())
+            response_body = self._invoke_model(model_id or self.chat_model_id, payload)
             return response_body
                 
         except Exception as e:
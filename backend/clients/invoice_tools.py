@@ -1,4 +1,5 @@
 import json
+import logging
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import numpy as np
@@ -6,6 +7,74 @@ from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
 from collections import defaultdict
 
+logger = logging.getLogger(__name__)
+
+def extract_totals(invoices: List[Dict[str, Any]]) -> np.ndarray:
+    """Flatten invoice totals into one array so aggregations run as NumPy reductions."""
+    totals = np.zeros(len(invoices), dtype=np.float64)
+    
+    for i, invoice in enumerate(invoices):
+        amount = invoice.get('data', {}).get('total_amount')
+        try:
+            totals[i] = float(amount or 0)
+        except (TypeError, ValueError):
+            pass  # Missing or non-numeric amounts count as 0
+    
+    return totals
+
+def compute_session_stats(invoices: List[Dict[str, Any]], totals: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Aggregate session-wide invoice statistics in a single pass.
+    
+    Vendors are returned sorted so summaries list them in a stable order.
+    """
+    if totals is None:
+        totals = extract_totals(invoices)
+    
+    vendors = set()
+    dates = []
+    payment_terms = defaultdict(int)
+    line_items_count = 0
+    
+    for invoice in invoices:
+        data = invoice.get('data', {})
+        
+        vendor = data.get('vendor_name')
+        if vendor:
+            vendors.add(vendor)
+        
+        date_str = data.get('date')
+        if date_str:
+            try:
+                dates.append(datetime.strptime(date_str, '%Y-%m-%d'))
+            except (TypeError, ValueError):
+                pass
+        
+        payment_terms[data.get('payment_terms', 'Unknown')] += 1
+        line_items_count += len(data.get('line_items') or [])
+    
+    highest = ("Unknown", 0.0)
+    if len(totals):
+        highest_idx = int(totals.argmax())
+        highest = (invoices[highest_idx].get('data', {}).get('vendor_name', 'Unknown'), float(totals[highest_idx]))
+    
+    date_range = None
+    if dates:
+        date_range = {
+            "earliest": min(dates).strftime('%Y-%m-%d'),
+            "latest": max(dates).strftime('%Y-%m-%d')
+        }
+    
+    return {
+        "invoice_count": len(invoices),
+        "total_amount": float(totals.sum()),
+        "vendors": tuple(sorted(vendors)),
+        "line_items_count": line_items_count,
+        "payment_terms": dict(payment_terms),
+        "highest": highest,
+        "date_range": date_range
+    }
+
 class InvoiceTools:
     def __init__(self, session_data: Dict[str, Any]):
         self.session_data = session_data
@@ -44,7 +113,7 @@ class InvoiceTools:
             
             return results
         except Exception as e:
-            print(f"Error in similarity search: {e}")
+            logger.warning("Error in similarity search: %s", e)
             return []
     
     def aggregate_amounts(self, group_by: str = "vendor", operation: str = "sum") -> Dict[str, Any]:
@@ -126,11 +195,21 @@ class InvoiceTools:
         """Filter invoices by various criteria."""
         filtered = []
         
+        # Normalize the filters once instead of once per invoice
+        vendor_filter = vendor.lower() if vendor else None
+        payment_terms_filter = payment_terms.lower() if payment_terms else None
+        try:
+            start_date = datetime.strptime(date_start, '%Y-%m-%d') if date_start else None
+            end_date = datetime.strptime(date_end, '%Y-%m-%d') if date_end else None
+        except ValueError:
+            # An unparseable bound matches no invoice
+            return filtered
+        
         for invoice in self.invoices:
             data = invoice.get('data', {})
             
             # Vendor filter
-            if vendor and vendor.lower() not in data.get('vendor_name', '').lower():
+            if vendor_filter and vendor_filter not in data.get('vendor_name', '').lower():
                 continue
             
             # Amount filters
@@ -142,22 +221,18 @@ class InvoiceTools:
             
             # Date filters
             invoice_date = data.get('date', '')
-            if date_start or date_end:
+            if start_date or end_date:
                 try:
                     inv_date = datetime.strptime(invoice_date, '%Y-%m-%d')
-                    if date_start:
-                        start_date = datetime.strptime(date_start, '%Y-%m-%d')
-                        if inv_date < start_date:
-                            continue
-                    if date_end:
-                        end_date = datetime.strptime(date_end, '%Y-%m-%d')
-                        if inv_date > end_date:
-                            continue
                 except:
                     continue
+                if start_date and inv_date < start_date:
+                    continue
+                if end_date and inv_date > end_date:
+                    continue
             
             # Payment terms filter
-            if payment_terms and payment_terms.lower() not in data.get('payment_terms', '').lower():
+            if payment_terms_filter and payment_terms_filter not in data.get('payment_terms', '').lower():
                 continue
             
             filtered.append(invoice)
@@ -202,46 +277,26 @@ class InvoiceTools:
         if not self.invoices:
             return {"error": "No invoices in session"}
         
-        total_amount = 0
-        vendors = set()
-        date_range = []
-        payment_terms = defaultdict(int)
-        
-        for invoice in self.invoices:
-            data = invoice.get('data', {})
-            
-            amount = data.get('total_amount', 0)
-            total_amount += amount
-            
-            vendor = data.get('vendor_name')
-            if vendor:
-                vendors.add(vendor)
-            
-            date_str = data.get('date')
-            if date_str:
-                try:
-                    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                    date_range.append(date_obj)
-                except:
-                    pass
-            
-            terms = data.get('payment_terms', 'Unknown')
-            payment_terms[terms] += 1
+        stats = compute_session_stats(self.invoices)
+        total_amount = stats["total_amount"]
+        highest_vendor, highest_amount = stats["highest"]
         
         summary = {
-            "total_invoices": len(self.invoices),
+            "total_invoices": stats["invoice_count"],
             "total_amount": round(total_amount, 2),
-            "average_amount": round(total_amount / len(self.invoices), 2),
-            "unique_vendors": len(vendors),
-            "vendor_list": list(vendors),
-            "payment_terms_breakdown": dict(payment_terms)
+            "average_amount": round(total_amount / stats["invoice_count"], 2),
+            "highest_invoice": {
+                "vendor_name": highest_vendor,
+                "amount": round(highest_amount, 2)
+            },
+            "unique_vendors": len(stats["vendors"]),
+            "vendor_list": list(stats["vendors"]),
+            "line_items_count": stats["line_items_count"],
+            "payment_terms_breakdown": dict(stats["payment_terms"])
         }
         
-        if date_range:
-            summary["date_range"] = {
-                "earliest": min(date_range).strftime('%Y-%m-%d'),
-                "latest": max(date_range).strftime('%Y-%m-%d')
-            }
+        if stats["date_range"]:
+            summary["date_range"] = dict(stats["date_range"])
         
         return summary
 
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+# Bump when the extraction prompts change so stale results are not served
+PROMPT_VERSION = "v3"
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "invoiceable-llm-cache")
+
+class LLMCache:
+    """
+    On-disk cache of validated model extraction results.
+
+    Entries are content-addressed by the prompt version, model and document
+    text, so re-processing a byte-identical document skips Bedrock entirely,
+    across restarts and across worker processes sharing the directory.
+
+    Entries hold full extraction results (personal data) with no size limit
+    or expiry, so the cache is off unless INVOICEABLE_LLM_CACHE=1 is set,
+    which is meant for local bulk runs. INVOICEABLE_LLM_CACHE_DIR overrides
+    the location; the directory is created readable by its owner only.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.environ.get("INVOICEABLE_LLM_CACHE", "0") == "1"
+        self.enabled = enabled
+        self.cache_dir = cache_dir or os.environ.get("INVOICEABLE_LLM_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if self.enabled:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+
+    def make_key(self, model: str, document_type: str, raw_text: str) -> str:
+        """Hash the cache inputs; each part is length-prefixed so boundaries can't collide."""
+        hasher = hashlib.sha256()
+        for part in (PROMPT_VERSION, model, document_type, raw_text):
+            data = part.encode("utf-8")
+            hasher.update(len(data).to_bytes(8, "big"))
+            hasher.update(data)
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for a key, or None on a miss."""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        if entry.get("prompt_version") != PROMPT_VERSION:
+            return None
+        return entry["response"]
+
+    def set(self, key: str, model: str, response: Dict[str, Any]) -> None:
+        """Store a response; written to a temp file and renamed so readers never see partial JSON."""
+        if not self.enabled:
+            return
+        entry = {
+            "model": model,
+            "prompt_version": PROMPT_VERSION,
+            "timestamp": time.time(),
+            "response": response
+        }
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        except OSError:
+            # Caching is best effort; a failed write only costs a future model call
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(entry, default=str))
+            os.replace(tmp_path, self._path(key))
+        except (OSError, TypeError):
+            # Don't leave the partial temp file behind
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
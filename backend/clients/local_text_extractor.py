@@ -1,5 +1,6 @@
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Union
 from pathlib import Path
 import PyPDF2
@@ -76,21 +77,25 @@ class LocalTextExtractor:
                 "document_name": os.path.basename(file_path)
             }
     
-    def extract_text_from_multiple_files(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+    def extract_text_from_multiple_files(self, file_paths: List[str], max_workers: int = 8) -> List[Dict[str, Any]]:
         """
         Extract text from multiple files (bulk processing).
         
+        Files are read and extracted concurrently so disk reads overlap;
+        results keep the same order as file_paths.
+        
         Args:
             file_paths: List of file paths to process
+            max_workers: Maximum number of files processed at once
             
         Returns:
             List of extraction results
         """
-        results = []
-        for file_path in file_paths:
-            result = self.extract_text_from_file(file_path)
-            results.append(result)
-        return results
+        if len(file_paths) <= 1:
+            return [self.extract_text_from_file(file_path) for file_path in file_paths]
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+            return list(executor.map(self.extract_text_from_file, file_paths))
     
     def _extract_from_pdf_bytes(self, pdf_bytes: bytes, document_name: str) -> Dict[str, Any]:
         """Extract text from PDF bytes using PyPDF2."""
@@ -112,29 +117,14 @@ class LocalTextExtractor:
             
             raw_text = "\n".join(text_content)
             
-            # Create lines by splitting on newlines
-            lines = [line.strip() for line in raw_text.split('\n') if line.strip()]
-            
-            # Estimate word count
-            words = raw_text.split()
-            
-            return {
-                "success": True,
-                "document_name": document_name,
-                "raw_text": raw_text,
-                "lines": [{"text": line, "confidence": 100.0} for line in lines],  # Local extraction = 100% confidence
-                "words": [{"text": word, "confidence": 100.0} for word in words[:100]],  # Limit words for memory
-                "total_lines": len(lines),
-                "total_words": len(words),
-                "total_pages": total_pages,
-                "average_confidence": 100.0,  # Local extraction
-                "extraction_metadata": {
-                    "extractor": "PyPDF2",
-                    "timestamp": time.time(),
-                    "file_size_bytes": len(pdf_bytes),
-                    "total_pages": total_pages  # Add page count to metadata
-                }
-            }
+            result = self._build_text_result(document_name, raw_text, {
+                "extractor": "PyPDF2",
+                "timestamp": time.time(),
+                "file_size_bytes": len(pdf_bytes),
+                "total_pages": total_pages  # Add page count to metadata
+            })
+            result["total_pages"] = total_pages
+            return result
             
         except Exception as e:
             return {
@@ -162,28 +152,12 @@ class LocalTextExtractor:
                     "document_name": document_name
                 }
             
-            # Create lines
-            lines = [line.strip() for line in raw_text.split('\n') if line.strip()]
-            
-            # Estimate word count
-            words = raw_text.split()
-            
-            return {
-                "success": True,
-                "document_name": document_name,
-                "raw_text": raw_text,
-                "lines": [{"text": line, "confidence": 100.0} for line in lines],
-                "words": [{"text": word, "confidence": 100.0} for word in words[:100]],
-                "total_lines": len(lines),
-                "total_words": len(words),
-                "average_confidence": 100.0,
-                "extraction_metadata": {
-                    "extractor": "direct_text",
-                    "timestamp": time.time(),
-                    "file_size_bytes": len(text_bytes),
-                    "encoding": "utf-8"
-                }
-            }
+            return self._build_text_result(document_name, raw_text, {
+                "extractor": "direct_text",
+                "timestamp": time.time(),
+                "file_size_bytes": len(text_bytes),
+                "encoding": "utf-8"
+            })
             
         except Exception as e:
             return {
@@ -191,6 +165,27 @@ class LocalTextExtractor:
                 "document_name": document_name
             }
     
+    def _build_text_result(self, document_name: str, raw_text: str,
+                           extraction_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the common extraction result (lines, words, counts) for extracted text."""
+        # Strip each line once and drop the empty ones
+        lines = [line for line in map(str.strip, raw_text.split('\n')) if line]
+        
+        # Estimate word count
+        words = raw_text.split()
+        
+        return {
+            "success": True,
+            "document_name": document_name,
+            "raw_text": raw_text,
+            "lines": [{"text": line, "confidence": 100.0} for line in lines],  # Local extraction = 100% confidence
+            "words": [{"text": word, "confidence": 100.0} for word in words[:100]],  # Limit words for memory
+            "total_lines": len(lines),
+            "total_words": len(words),
+            "average_confidence": 100.0,  # Local extraction
+            "extraction_metadata": extraction_metadata
+        }
+    
     def get_supported_extensions(self) -> List[str]:
         """Get list of supported file extensions."""
         return list(self.supported_extensions)
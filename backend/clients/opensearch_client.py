@@ -1,9 +1,28 @@
-import boto3
-import json
+import io
+import logging
+import os
+import threading
 import time
-from typing import Dict, List, Any, Optional
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import hashlib
+import numpy as np
+import orjson
+from botocore.exceptions import ClientError
+from .aws_clients import get_client, TRANSFER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Read size when streaming S3 object bodies
+S3_READ_CHUNK_SIZE = 1024 * 1024
+
+# Titan embeddings keyed by a hash of the input text, so repeated chat queries
+# and re-uploaded documents don't pay for another Bedrock call
+_EMBEDDING_CACHE_SIZE = 1024
+_embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
 
 class OpenSearchClient:
     _instance = None
@@ -20,26 +39,36 @@ class OpenSearchClient:
         if self._initialized:
             return
             
-        session = boto3.Session()
-        self.bedrock_runtime = session.client("bedrock-runtime", region_name=region_name)
-        self.s3_client = session.client("s3", region_name=region_name)
+        self.bedrock_runtime = get_client("bedrock-runtime", region_name)
+        self.s3_client = get_client("s3", region_name)
         
         # Configuration
         self.s3_bucket = "csu-summer-camp-invoice-extraction-2025"
         self.s3_prefix = "invoices/"
+        self.upload_prefix = "uploads/"
         self.embedding_model = "amazon.titan-embed-text-v2:0"
         
         # In-memory document store (replace with actual OpenSearch when available)
         self.documents = {}
-        self.embeddings = {}
+        # Unit-length embedding per document, so a search is one matrix-vector product
+        self.embeddings: Dict[str, np.ndarray] = {}
+        # Document IDs per session, in upload order, so session lookups don't scan every document
+        self.session_index: Dict[str, Dict[str, None]] = {}
         
         self._initialized = True
-        print("🔧 OpenSearchClient singleton initialized")
+        logger.info("OpenSearchClient singleton initialized")
     
     def generate_embeddings(self, text: str) -> List[float]:
-        """Generate embeddings using Amazon Titan."""
+        """Generate embeddings using Amazon Titan; results are cached per input text."""
+        cache_key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with _embedding_cache_lock:
+            cached = _embedding_cache.get(cache_key)
+            if cached is not None:
+                _embedding_cache.move_to_end(cache_key)
+                return cached
+        
         try:
-            body = json.dumps({
+            body = orjson.dumps({
                 "inputText": text
             })
             
@@ -48,38 +77,159 @@ class OpenSearchClient:
                 body=body
             )
             
-            result = json.loads(response['body'].read())
-            return result['embedding']
+            result = orjson.loads(response['body'].read())
+            embedding = result['embedding']
             
         except Exception as e:
-            print(f"Error generating embeddings: {e}")
+            logger.warning("Error generating embeddings: %s", e)
             return []
+        
+        with _embedding_cache_lock:
+            _embedding_cache[cache_key] = embedding
+            if len(_embedding_cache) > _EMBEDDING_CACHE_SIZE:
+                _embedding_cache.popitem(last=False)
+        return embedding
     
-    def upload_and_store_document(self, file_content: bytes, filename: str, session_id: str, 
-                                 raw_text: str, structured_data: dict) -> Dict[str, Any]:
-        """Upload to S3 and store document with embeddings."""
+    def generate_upload_url(self, filename: str, content_type: str = 'application/pdf',
+                            expires_in: int = 900) -> Dict[str, Any]:
+        """Create a presigned PUT URL so clients can upload straight to S3."""
         try:
-            # Step 1: Upload to S3 with session prefix
-            session_filename = f"{session_id}_{filename}"
-            s3_key = f"{self.s3_prefix}{session_filename}"
+            s3_key = f"{self.upload_prefix}{uuid.uuid4()}_{os.path.basename(filename)}"
             
-            metadata = {
-                'session_id': session_id,
-                'original_filename': filename,
-                'upload_timestamp': datetime.utcnow().isoformat()
+            url = self.s3_client.generate_presigned_url(
+                'put_object',
+                Params={
+                    'Bucket': self.s3_bucket,
+                    'Key': s3_key,
+                    'ContentType': content_type
+                },
+                ExpiresIn=expires_in
+            )
+            
+            return {
+                'success': True,
+                'url': url,
+                's3_key': s3_key,
+                'bucket_name': self.s3_bucket,
+                'expires_in': expires_in
             }
             
-            self.s3_client.put_object(
-                Bucket=self.s3_bucket,
-                Key=s3_key,
-                Body=file_content,
-                Metadata=metadata,
-                ContentType='application/pdf'
-            )
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to create upload URL: {str(e)}"
+            }
+    
+    def download_document(self, s3_key: str, bucket_name: Optional[str] = None) -> Tuple[bytes, str, str]:
+        """
+        Download a document from S3 and return (bytes, content hash, ETag).
+        
+        A HEAD request gives the size and ETag first. Objects above the
+        multipart threshold are fetched as parallel ranged GETs with
+        TRANSFER_CONFIG; smaller ones with a single GET whose body is hashed
+        chunk by chunk as it streams in, so the dedup hash costs no second
+        pass. Both downloads are pinned to the object the HEAD saw, so the
+        returned ETag always describes the returned bytes: the GET with
+        IfMatch, and the ranged download (which only accepts VersionId among
+        the precondition arguments) by version where the bucket is versioned,
+        otherwise by re-checking the ETag afterwards.
+        """
+        bucket = bucket_name or self.s3_bucket
+        head = self.s3_client.head_object(Bucket=bucket, Key=s3_key)
+        etag = head['ETag']
+        
+        if head.get('ContentLength', 0) >= TRANSFER_CONFIG.multipart_threshold:
+            version_id = head.get('VersionId')
+            extra_args = {'VersionId': version_id} if version_id else None
+            buffer = io.BytesIO()
+            self.s3_client.download_fileobj(bucket, s3_key, buffer, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
+            if not version_id and self.get_document_etag(s3_key, bucket) != etag:
+                raise RuntimeError(f"s3://{bucket}/{s3_key} changed during download")
+            file_content = buffer.getvalue()
+            return file_content, hashlib.blake2b(file_content, digest_size=16).hexdigest(), etag
+        
+        body = self.s3_client.get_object(Bucket=bucket, Key=s3_key, IfMatch=etag)['Body']
+        
+        hasher = hashlib.blake2b(digest_size=16)
+        chunks = []
+        for chunk in body.iter_chunks(chunk_size=S3_READ_CHUNK_SIZE):
+            hasher.update(chunk)
+            chunks.append(chunk)
+        
+        # One join allocates the result once instead of regrowing a buffer per chunk
+        return b''.join(chunks), hasher.hexdigest(), etag
+    
+    def get_document_etag(self, s3_key: str, bucket_name: Optional[str] = None) -> str:
+        """Return an S3 object's ETag with a HEAD request (no body transfer)."""
+        response = self.s3_client.head_object(Bucket=bucket_name or self.s3_bucket, Key=s3_key)
+        return response['ETag']
+    
+    def upload_document(self, file_content: bytes, filename: str, session_id: str,
+                        content_hash: Optional[str] = None) -> str:
+        """
+        Upload a document to S3 and return its key.
+        
+        Documents are stored under a key derived from a hash of their bytes, so
+        re-uploads of the same file (retries, double submits, the same invoice
+        in several sessions) are detected with a HEAD request and not sent again.
+        """
+        if content_hash is None:
+            content_hash = hashlib.blake2b(file_content, digest_size=16).hexdigest()
+        s3_key = f"{self.s3_prefix}{content_hash}{os.path.splitext(filename)[1].lower()}"
+        
+        if self._object_exists(s3_key):
+            return s3_key
+        
+        self.s3_client.upload_fileobj(
+            io.BytesIO(file_content),
+            self.s3_bucket,
+            s3_key,
+            ExtraArgs={'Metadata': self._build_metadata(filename, session_id), 'ContentType': 'application/pdf'},
+            Config=TRANSFER_CONFIG
+        )
+        
+        return s3_key
+    
+    def _object_exists(self, s3_key: str) -> bool:
+        """Check whether an object already exists in the bucket."""
+        try:
+            self.s3_client.head_object(Bucket=self.s3_bucket, Key=s3_key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+    
+    def _build_metadata(self, filename: str, session_id: str) -> Dict[str, str]:
+        """Metadata recorded on the S3 object and the document record."""
+        return {
+            'session_id': session_id,
+            'original_filename': filename,
+            'upload_timestamp': datetime.utcnow().isoformat()
+        }
+    
+    def upload_and_store_document(self, file_content: bytes, filename: str, session_id: str, 
+                                 raw_text: str, structured_data: dict,
+                                 s3_key: Optional[str] = None,
+                                 embeddings: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Upload to S3 and store document with embeddings.
+        
+        Callers that already uploaded the document (presigned upload or a
+        background upload_document call) pass s3_key to skip the upload, and
+        callers that generated embeddings concurrently pass them in.
+        """
+        try:
+            metadata = self._build_metadata(filename, session_id)
+            
+            # Step 1: Upload to S3 with session prefix
+            if not s3_key:
+                s3_key = self.upload_document(file_content, filename, session_id)
             
             # Step 2: Generate embeddings for text
-            print(f"Generating embeddings for {filename}...")
-            embeddings = self.generate_embeddings(raw_text)
+            if embeddings is None:
+                logger.debug("Generating embeddings for %s", filename)
+                embeddings = self.generate_embeddings(raw_text)
             
             # Step 3: Create document record
             doc_id = hashlib.md5(f"{session_id}_{filename}".encode()).hexdigest()
@@ -99,9 +249,11 @@ class OpenSearchClient:
             
             # Step 4: Store in document store (replace with OpenSearch)
             self.documents[doc_id] = document
-            self.embeddings[doc_id] = embeddings
+            if embeddings:
+                self.embeddings[doc_id] = self._unit_vector(embeddings)
+            self.session_index.setdefault(session_id, {})[doc_id] = None
             
-            print(f"✅ Document stored: {filename} (ID: {doc_id})")
+            logger.info("Document stored: %s (ID: %s)", filename, doc_id)
             
             return {
                 'success': True,
@@ -125,9 +277,8 @@ class OpenSearchClient:
             if not query_embeddings:
                 return {'success': False, 'error': 'Failed to generate query embeddings'}
             
-            # Filter documents by session
-            session_docs = {doc_id: doc for doc_id, doc in self.documents.items() 
-                           if doc['session_id'] == session_id}
+            # Documents in this session
+            session_docs = {doc_id: self.documents[doc_id] for doc_id in self._session_document_ids(session_id)}
             
             if not session_docs:
                 return {
@@ -136,27 +287,30 @@ class OpenSearchClient:
                     'message': 'No documents found in this session'
                 }
             
-            # Calculate similarities
-            similarities = []
-            for doc_id, doc in session_docs.items():
-                doc_embeddings = self.embeddings.get(doc_id, [])
-                
-                if doc_embeddings:
-                    similarity = self._cosine_similarity(query_embeddings, doc_embeddings)
-                    similarities.append((similarity, doc_id, doc))
+            # Cosine similarity against every embedded document at once
+            doc_ids = [doc_id for doc_id in session_docs if doc_id in self.embeddings]
+            similarities = np.zeros(0)
+            if doc_ids:
+                doc_matrix = np.stack([self.embeddings[doc_id] for doc_id in doc_ids])
+                similarities = doc_matrix @ self._unit_vector(query_embeddings)
             
-            # Sort by similarity and return top results (lower threshold for testing)
-            similarities.sort(reverse=True, key=lambda x: x[0])
+            # Sort by similarity (stable, so ties keep upload order) and return top results
+            top = np.argsort(-similarities, kind='stable')[:limit]
             
             results = []
-            for similarity, doc_id, doc in similarities[:limit]:
+            for index in top:
+                doc_id = doc_ids[index]
+                doc = session_docs[doc_id]
+                similarity = float(similarities[index])
                 # Lower threshold for testing - include any similarity > 0
                 if similarity > 0:
+                    raw_text = doc['raw_text']
+                    snippet = raw_text[:300]
                     results.append({
                         'document_id': doc_id,
                         'filename': doc['filename'],
                         'similarity_score': similarity,
-                        'content_snippet': doc['raw_text'][:300] + "..." if len(doc['raw_text']) > 300 else doc['raw_text'],
+                        'content_snippet': snippet + "..." if len(raw_text) > 300 else snippet,
                         'structured_data': doc['structured_data'],
                         's3_location': doc['s3_location']
                     })
@@ -177,10 +331,13 @@ class OpenSearchClient:
     
     def get_session_documents(self, session_id: str) -> List[Dict]:
         """Get all documents for a session."""
-        session_docs = [doc for doc in self.documents.values() 
-                       if doc['session_id'] == session_id]
+        session_docs = [self.documents[doc_id] for doc_id in self._session_document_ids(session_id)]
         return session_docs
     
+    def _session_document_ids(self, session_id: str) -> Tuple[str, ...]:
+        """Snapshot of a session's document IDs (safe against concurrent uploads)."""
+        return tuple(self.session_index.get(session_id, ()))
+    
     def aggregate_data(self, session_id: str, field: str, operation: str = 'sum') -> Dict[str, Any]:
         """Aggregate data across session documents."""
         try:
@@ -232,23 +389,8 @@ class OpenSearchClient:
                 'error': f"Aggregation failed: {str(e)}"
             }
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        try:
-            import math
-            
-            # Calculate dot product
-            dot_product = sum(a * b for a, b in zip(vec1, vec2))
-            
-            # Calculate magnitudes
-            magnitude1 = math.sqrt(sum(a * a for a in vec1))
-            magnitude2 = math.sqrt(sum(b * b for b in vec2))
-            
-            # Avoid division by zero
-            if magnitude1 == 0 or magnitude2 == 0:
-                return 0
-            
-            return dot_product / (magnitude1 * magnitude2)
-            
-        except Exception:
-            return 0 
\ No newline at end of file
+    def _unit_vector(self, vector: List[float]) -> np.ndarray:
+        """Scale a vector to unit length (a zero vector stays zero)."""
+        array = np.asarray(vector, dtype=np.float64)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
@@ -0,0 +1,178 @@
+import re
+from datetime import date, datetime
+from typing import Dict, Any, Optional
+
+# Patterns are written so every input has a single way to match: whitespace
+# after an optional ':' / '#' / '$' is consumed together with it (\s*(?::\s*)?
+# rather than \s*:?\s*), so a long whitespace run can't be split between
+# adjacent \s* in O(n^2) or O(n^3) ways before the match fails.
+#
+# All patterns are re.ASCII: \d, \s and case-insensitive letters only match
+# ASCII, as invoice fields are, so the engine skips Unicode category lookups.
+# No-break spaces from PDF text are turned into plain spaces first (see
+# extract_fields) so they still count as \s.
+
+# Labeled invoice numbers. The lookahead requires a digit inside the captured
+# token, which rejects label words like "Invoice Number: Date" as part of the
+# same search, so a later real number is still found.
+_INVOICE_NUMBER = re.compile(
+    r'(?:invoice\s*(?:number|no\.?|num)\s*(?:[:#]\s*)?'
+    r'|invoice\s*#\s*(?::\s*)?'
+    r'|\binv\s*(?:#|no\.?)\s*(?::\s*)?)'
+    r'(?=[A-Z\-/]*\d)([A-Z0-9][A-Z0-9\-/]*)',
+    re.IGNORECASE | re.ASCII
+)
+
+# Labeled totals and dates, fused into one alternation so the text is scanned
+# once; the matching group name (lastgroup) says which label was found. The
+# specific "amount due" style labels win over a bare "Total".
+_LABELED_FIELDS = re.compile(
+    r'(?:total\s+amount\s+due|amount\s+due|balance\s+due|invoice\s+total)\s*(?::\s*)?(?:\$\s*)?(?P<total_due>[\d,]+\.\d{2})'
+    r'|\btotal\s*(?::\s*)?(?:\$\s*)?(?P<total>[\d,]+\.\d{2})'
+    r'|(?:\binvoice\s+|\b(?<!due\s))date\s*(?::\s*)?(?P<date>\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|[A-Z][a-z]+\.?\s+\d{1,2},?\s+\d{4})',
+    re.IGNORECASE | re.ASCII
+)
+_DOLLAR_AMOUNT = re.compile(r'\$\s*([\d,]+\.\d{2})', re.ASCII)
+
+# Looser last-resort patterns (see fallback_fields)
+_FALLBACK_AMOUNT = re.compile(r'\$[\d,]+\.?\d*', re.ASCII)
+_FALLBACK_INVOICE_NUMBER = re.compile(r'(?:invoice|inv)[\s#:]*(\w+)', re.IGNORECASE | re.ASCII)
+
+_DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%B %d, %Y', '%B %d %Y', '%b %d, %Y', '%b. %d, %Y', '%b %d %Y')
+
+_VENDOR_SUFFIXES = ('LLP', 'LLC', 'Inc', 'Corp', 'Corporation', 'Company', 'Co', 'Ltd', 'LP')
+# A whole line that is a company name: words of letters and name punctuation
+# ending in a suffix. Digits aren't allowed, so address lines such as
+# "Pomona, CA 91761 Sability, LP" (where PDF text runs two blocks together)
+# don't count. Words and separators use disjoint classes, so a line has one
+# way to match.
+_VENDOR_LINE = re.compile(r"(?:[A-Za-z&.'\-]+[ ,]+)+(?:" + '|'.join(_VENDOR_SUFFIXES) + r")\.?", re.ASCII)
+_VENDOR_SCAN_LINES = 10
+
+class RuleExtractor:
+    """Regex-based extraction of the basic invoice fields, used before any LLM call."""
+
+    def extract_fields(self, raw_text: str) -> Dict[str, Any]:
+        """
+        Extract vendor, invoice number, total and date from raw text.
+
+        Args:
+            raw_text: Raw text from text extraction
+
+        Returns:
+            Dictionary with only the fields that were found
+        """
+        if '\xa0' in raw_text:
+            raw_text = raw_text.replace('\xa0', ' ')
+
+        labels = self._scan_labeled_fields(raw_text)
+        values = {
+            'vendor_name': self._extract_vendor_name(raw_text),
+            'invoice_number': self._extract_invoice_number(raw_text),
+            'total_amount': self._extract_total_amount(raw_text, labels),
+            'date': self._extract_date(labels)
+        }
+        return {field: value for field, value in values.items() if value is not None}
+
+    def fallback_fields(self, raw_text: str, fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Best-effort fields for when model extraction fails.
+
+        Starts from extract_fields (pass fields if they were already computed,
+        so the text isn't scanned again) and fills a missing total or invoice
+        number from the first '$' amount or word after "invoice".
+        """
+        if fields is None:
+            fields = self.extract_fields(raw_text)
+        extracted = dict(fields)
+
+        if 'total_amount' not in extracted:
+            amount_match = _FALLBACK_AMOUNT.search(raw_text)
+            if amount_match:
+                try:
+                    extracted['total_amount'] = float(amount_match.group()[1:].replace(',', ''))
+                except ValueError:
+                    pass
+
+        if 'invoice_number' not in extracted:
+            invoice_match = _FALLBACK_INVOICE_NUMBER.search(raw_text)
+            if invoice_match:
+                extracted['invoice_number'] = invoice_match.group(1)
+
+        return extracted
+
+    def _extract_vendor_name(self, raw_text: str) -> Optional[str]:
+        """Find a header line that is a company name (... LLP, LLC, Inc, ...)."""
+        # maxsplit stops splitting after the header instead of splitting the whole document
+        for line in raw_text.split('\n', _VENDOR_SCAN_LINES)[:_VENDOR_SCAN_LINES]:
+            line = line.strip()
+            if _VENDOR_LINE.fullmatch(line):
+                return line
+        return None
+
+    def _extract_invoice_number(self, raw_text: str) -> Optional[str]:
+        """Find the first labeled invoice number."""
+        match = _INVOICE_NUMBER.search(raw_text)
+        return match.group(1) if match else None
+
+    def _scan_labeled_fields(self, raw_text: str) -> Dict[str, str]:
+        """Collect the first value for each labeled field in a single pass over the text."""
+        labels = {}
+        for match in _LABELED_FIELDS.finditer(raw_text):
+            labels.setdefault(match.lastgroup, match.group(match.lastgroup))
+            # Nothing later can change the result once the best total and date are known
+            if 'total_due' in labels and 'date' in labels:
+                break
+        return labels
+
+    def _extract_total_amount(self, raw_text: str, labels: Dict[str, str]) -> Optional[float]:
+        """Use the labeled total, falling back to the largest dollar amount."""
+        total = labels.get('total_due') or labels.get('total')
+        if total:
+            return float(total.replace(',', ''))
+
+        # Every dollar amount starts with a literal '$'; skip the regex when there is none
+        # and start the scan at the first one
+        first_dollar = raw_text.find('$')
+        if first_dollar < 0:
+            return None
+
+        largest = None
+        for match in _DOLLAR_AMOUNT.finditer(raw_text, first_dollar):
+            amount = float(match.group(1).replace(',', ''))
+            if largest is None or amount > largest:
+                largest = amount
+        return largest
+
+    def _extract_date(self, labels: Dict[str, str]) -> Optional[str]:
+        """Return the labeled date as YYYY-MM-DD."""
+        date = labels.get('date')
+        if date:
+            return self._normalize_date(date)
+        return None
+
+    def _normalize_date(self, date_str: str) -> Optional[str]:
+        """Convert a date string in a known format to YYYY-MM-DD."""
+        # MM/DD/YY and MM/DD/YYYY are the common case; build those directly
+        # instead of trying each strptime format in turn
+        parts = date_str.split('/')
+        if len(parts) == 3:
+            month, day, year = parts
+            if len(year) not in (2, 4):
+                return None
+            try:
+                year_num = int(year)
+                if len(year) == 2:
+                    # Same pivot as strptime's %y
+                    year_num += 2000 if year_num < 69 else 1900
+                return date(year_num, int(month), int(day)).isoformat()
+            except ValueError:
+                return None
+
+        date_str = ' '.join(date_str.split())
+        for date_format in _DATE_FORMATS:
+            try:
+                return datetime.strptime(date_str, date_format).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        return None
@@ -1,3 +1,4 @@
+import logging
 import uuid
 import time
 import threading
@@ -7,6 +8,8 @@ import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+logger = logging.getLogger(__name__)
+
 class SessionManager:
     def __init__(self):
         self.sessions: Dict[str, Dict] = {}
@@ -34,7 +37,7 @@ class SessionManager:
                 "last_accessed": datetime.now()
             }
         
-        print(f"✅ Created session {session_id} with {len(invoices)} invoices")
+        logger.info("Created session %s with %d invoices", session_id, len(invoices))
         return session_id
     
     def get_session(self, session_id: str) -> Optional[Dict]:
@@ -51,7 +54,7 @@ class SessionManager:
         with self.session_lock:
             if session_id in self.sessions:
                 del self.sessions[session_id]
-                print(f"🗑️ Deleted session {session_id}")
+                logger.info("Deleted session %s", session_id)
                 return True
             return False
     
@@ -82,9 +85,10 @@ class SessionManager:
             # Add raw text if available
             raw_text = invoice.get('raw_text', '')
             if raw_text:
-                # Take more text and clean it up
-                clean_text = raw_text.replace('\n', ' ').replace('\r', ' ')
-                text_parts.append(clean_text[:1000])  # First 1000 chars
+                # Take the first 1000 chars and clean them up; slicing first keeps
+                # the replaces from copying the whole document
+                clean_text = raw_text[:1000].replace('\n', ' ').replace('\r', ' ')
+                text_parts.append(clean_text)
             
             # Add document name
             doc_name = invoice.get('document_name', '')
@@ -112,7 +116,7 @@ class SessionManager:
                 embeddings = vectorizer.fit_transform(texts).toarray()
                 return embeddings, texts
             except ValueError as e:
-                print(f"⚠️ TF-IDF failed: {e}, using simple text storage")
+                logger.warning("TF-IDF failed: %s, using simple text storage", e)
                 # Fallback: just store texts without embeddings
                 return np.array([]), texts
         
@@ -142,7 +146,7 @@ class SessionManager:
             self.delete_session(session_id)
         
         if expired_sessions:
-            print(f"🧹 Cleaned up {len(expired_sessions)} expired sessions")
+            logger.info("Cleaned up %d expired sessions", len(expired_sessions))
     
     def get_session_count(self) -> int:
         """Get current number of active sessions."""
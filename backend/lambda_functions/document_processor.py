@@ -1,161 +1,324 @@
-import json
 import base64
-import tempfile
+import hashlib
+import logging
 import os
+import threading
 import uuid
-from typing import Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
 
-# Import clients
-from backend.clients.local_text_extractor import LocalTextExtractor
-from backend.clients.claude_client import ClaudeClient
-from backend.clients.opensearch_client import OpenSearchClient
+import orjson
 
-# Initialize clients
-text_extractor = LocalTextExtractor()
-claude_client = ClaudeClient()
-opensearch_client = OpenSearchClient()
+# Lambda's root logger defaults to WARNING; per-step detail is DEBUG
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+# Clients are created on first use (see _ensure_clients) so importing this
+# module stays cheap; a {"warmup": true} event creates them ahead of traffic
+text_extractor = None
+claude_client = None
+opensearch_client = None
+_clients_ready = False
+_clients_lock = threading.Lock()
+
+# Headers for every Lambda response, built once and shared
+RESPONSE_HEADERS = {'Content-Type': 'application/json'}
+
+# Background pool for the S3 upload and embedding calls that overlap with Claude formatting
+executor = ThreadPoolExecutor(max_workers=8)
+
+# Largest file accepted as base64 in the request body; bigger files go
+# through a presigned S3 upload instead
+MAX_INLINE_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Extraction + formatting results keyed by (content hash, document type), so a
+# re-submitted file skips text extraction and Claude entirely
+EXTRACTION_CACHE_SIZE = 256
+extraction_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+extraction_cache_lock = threading.Lock()
+
+# Content hash of S3 objects already downloaded, keyed by (bucket, key) and
+# checked against the object's current ETag, so re-processing an unchanged
+# object needs only a HEAD request instead of a full download
+S3_DIGEST_CACHE_SIZE = 1024
+s3_digest_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+s3_digest_cache_lock = threading.Lock()
 
 def lambda_handler(event, context):
     """
     AWS Lambda handler for document processing with direct OpenSearch storage.
     """
+    if event.get('warmup'):
+        _ensure_clients()
+        return {
+            'statusCode': 200,
+            'headers': RESPONSE_HEADERS,
+            'body': orjson.dumps({'success': True, 'warmed': True}).decode()
+        }
+    
     try:
         # Parse the event
         if isinstance(event.get('body'), str):
-            body = json.loads(event['body'])
+            body = orjson.loads(event['body'])
         else:
             body = event.get('body', {})
         
+        status_code, response_data = handle_document_request(body)
+    except Exception as e:
+        logger.exception("Processing error: %s", e)
+        status_code, response_data = _error_response(500, f'Document processing failed: {str(e)}')
+    
+    # The response is serialized once, here; orjson encodes large
+    # structured_data/raw_text payloads much faster than stdlib json
+    return {
+        'statusCode': status_code,
+        'headers': RESPONSE_HEADERS,
+        'body': orjson.dumps(response_data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    }
+
+def handle_document_request(body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    """
+    Process a parsed request body.
+    
+    In-process callers (the API server) use this directly so the response
+    dict is never serialized to JSON and parsed back.
+    
+    Args:
+        body: Request body with file_data or s3_key, plus session_id
+    
+    Returns:
+        (HTTP status code, response dict)
+    """
+    try:
         file_data = body.get('file_data')
-        file_name = body.get('file_name', 'unknown.pdf')
+        s3_key = body.get('s3_key')
+        bucket_name = body.get('bucket_name')
+        file_name = body.get('file_name') or (os.path.basename(s3_key) if s3_key else 'unknown.pdf')
         document_type = body.get('document_type', 'invoice')
         session_id = body.get('session_id')
         
-        if not file_data:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'No file data provided'
-                })
-            }
+        if not file_data and not s3_key:
+            return _error_response(400, 'No file data provided')
         
         if not session_id:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'No session ID provided'
-                })
-            }
+            return _error_response(400, 'No session ID provided')
         
-        print(f"Processing document: {file_name} for session: {session_id}")
+        _ensure_clients()
+        logger.info("Processing document: %s for session: %s", file_name, session_id)
         
-        # Decode the base64 file data
-        try:
-            file_content = base64.b64decode(file_data)
-        except Exception as e:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'success': False,
-                    'error': f'Invalid base64 data: {str(e)}'
-                })
-            }
+        if s3_key:
+            # Only objects uploaded through /presign-upload may be read; anything
+            # else would let callers fetch arbitrary objects the role can access
+            if bucket_name not in (None, opensearch_client.s3_bucket):
+                return _error_response(403, f'Bucket {bucket_name} is not allowed')
+            if not s3_key.startswith(opensearch_client.upload_prefix):
+                return _error_response(403, f'S3 key must be under {opensearch_client.upload_prefix}')
         
-        # Step 1: Extract text first
-        print("Extracting text...")
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
+        # Presigned uploads are already in our bucket and don't need a second upload
+        existing_s3_key = s3_key or None
         
-        try:
-            # Extract text
-            extraction_result = text_extractor.extract_text_from_file(temp_file_path)
-            
-            if not extraction_result.get('success'):
-                return {
-                    'statusCode': 500,
-                    'body': json.dumps({
-                        'success': False,
-                        'error': f"Text extraction failed: {extraction_result.get('error', 'Unknown error')}"
-                    })
-                }
-            
-            print(f"Text extracted: {extraction_result.get('total_words', 0)} words")
-            
-            # Step 2: Format with Claude
-            print("Formatting with Claude...")
-            raw_text = extraction_result.get('raw_text', '')
-            structured_result = claude_client.format_extracted_text(raw_text, document_type)
-            
-            if 'error' in structured_result:
-                print(f"Claude formatting failed: {structured_result['error']}")
-                # Continue without structured data
-                structured_data = {}
-                extraction_confidence = 0.5
-            else:
-                structured_data = structured_result
-                extraction_confidence = structured_result.get('confidence', 0.8)
-            
-            print("Claude formatting completed")
+        if s3_key:
+            # Client uploaded straight to S3 with a presigned URL
+            bucket = opensearch_client.s3_bucket
+            try:
+                file_content = None
+                content_hash = _known_s3_digest(bucket, s3_key)
+                
+                # The bytes are only needed when the extraction isn't cached
+                if content_hash is None or not _has_cached_extraction((content_hash, document_type)):
+                    file_content, content_hash, etag = opensearch_client.download_document(s3_key, bucket)
+                    _remember_s3_digest(bucket, s3_key, etag, content_hash)
+            except Exception as e:
+                return _error_response(400, f'Could not read s3://{bucket}/{s3_key}: {str(e)}')
+        else:
+            # Reject oversized uploads from the encoded length, before allocating the decoded bytes
+            if _decoded_base64_size(file_data) > MAX_INLINE_UPLOAD_BYTES:
+                return _error_response(400, f'File too large: uploads over {MAX_INLINE_UPLOAD_BYTES // (1024 * 1024)} MB must go through /presign-upload')
             
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            # Decode the base64 file data
+            try:
+                file_content = base64.b64decode(file_data)
+                content_hash = hashlib.blake2b(file_content, digest_size=16).hexdigest()
+            except Exception as e:
+                return _error_response(400, f'Invalid base64 data: {str(e)}')
         
-        # Step 3: Upload to S3 and store in OpenSearch with embeddings
-        print("Storing in OpenSearch with embeddings...")
-        storage_result = opensearch_client.upload_and_store_document(
-            file_content=file_content,
-            filename=file_name,
-            session_id=session_id,
-            raw_text=raw_text,
-            structured_data=structured_data
-        )
+        return _process_bytes(file_content, content_hash, file_name, session_id, document_type,
+                              existing_s3_key=existing_s3_key, file_data=file_data)
         
-        if not storage_result['success']:
-            return {
-                'statusCode': 500,
-                'body': json.dumps({
-                    'success': False,
-                    'error': f"Storage failed: {storage_result['error']}"
-                })
-            }
+    except Exception as e:
+        logger.exception("Processing error: %s", e)
+        return _error_response(500, f'Document processing failed: {str(e)}')
+
+def _ensure_clients() -> None:
+    """Import and create the module's clients the first time they are needed."""
+    global text_extractor, claude_client, opensearch_client, _clients_ready
+    if _clients_ready:
+        return
+    with _clients_lock:
+        if _clients_ready:
+            return
+        # PyPDF2, NumPy and the boto3 clients load here rather than at import
+        from backend.clients.local_text_extractor import LocalTextExtractor
+        from backend.clients.claude_client import ClaudeClient
+        from backend.clients.opensearch_client import OpenSearchClient
         
-        print(f"✅ Document stored with embeddings: {storage_result['document_id']}")
+        text_extractor = LocalTextExtractor()
+        claude_client = ClaudeClient()
+        opensearch_client = OpenSearchClient()
+        _clients_ready = True
+
+def _error_response(status_code: int, message: str) -> Tuple[int, Dict[str, Any]]:
+    """Build an error result for handle_document_request."""
+    return status_code, {'success': False, 'error': message}
+
+def _decoded_base64_size(file_data: str) -> int:
+    """Size in bytes that base64 data decodes to, computed without decoding it."""
+    return len(file_data) * 3 // 4 - file_data.count('=', -2)
+
+def _known_s3_digest(bucket: str, s3_key: str) -> Optional[str]:
+    """Return the cached content hash of an S3 object if its ETag hasn't changed."""
+    with s3_digest_cache_lock:
+        entry = s3_digest_cache.get((bucket, s3_key))
+    if entry is None:
+        return None
+    
+    etag, content_hash = entry
+    if opensearch_client.get_document_etag(s3_key, bucket) != etag:
+        return None
+    return content_hash
+
+def _remember_s3_digest(bucket: str, s3_key: str, etag: str, content_hash: str) -> None:
+    """Record the content hash of a downloaded S3 object."""
+    with s3_digest_cache_lock:
+        s3_digest_cache[(bucket, s3_key)] = (etag, content_hash)
+        s3_digest_cache.move_to_end((bucket, s3_key))
+        if len(s3_digest_cache) > S3_DIGEST_CACHE_SIZE:
+            s3_digest_cache.popitem(last=False)
+
+def _has_cached_extraction(cache_key: tuple) -> bool:
+    """Check whether an extraction result is cached for (content hash, document type)."""
+    with extraction_cache_lock:
+        return cache_key in extraction_cache
+
+def _process_bytes(file_content: Optional[bytes], content_hash: str, file_name: str, session_id: str,
+                   document_type: str, existing_s3_key: Optional[str] = None,
+                   file_data: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+    """
+    Extract, format and store a document that is already in memory.
+    
+    Both input paths (base64 body and S3 key) end here once they have the raw
+    bytes, so the bytes are never re-encoded to be passed along.
+    
+    Args:
+        file_content: Raw document bytes, or None for an S3 object in our bucket
+            whose extraction is cached
+        content_hash: BLAKE2b hex digest of file_content
+        file_name: Original file name
+        session_id: Session the document belongs to
+        document_type: Type of document (invoice, receipt, etc.)
+        existing_s3_key: Key of the object if it is already in our bucket
+        file_data: Original base64 upload, echoed back for the PDF preview
+    
+    Returns:
+        (HTTP status code, response dict)
+    """
+    cache_key = (content_hash, document_type)
+    
+    with extraction_cache_lock:
+        cached = extraction_cache.get(cache_key)
+        if cached:
+            extraction_cache.move_to_end(cache_key)
+    
+    if cached:
+        logger.debug("Reusing extraction for identical document %s", content_hash)
+        extraction_result, structured_result = cached
+    else:
+        if file_content is None:
+            # The cached extraction was evicted after the ETag check
+            file_content, _, _ = opensearch_client.download_document(existing_s3_key)
         
-        # Prepare response
-        response_data = {
-            'success': True,
-            'document_name': file_name,
-            'session_id': session_id,
-            'structured_data': structured_data,
-            'raw_text': raw_text,
-            'extraction_confidence': extraction_confidence,
-            'extraction_metadata': extraction_result.get('extraction_metadata', {}),
-            's3_location': storage_result['s3_location'],
-            'document_id': storage_result['document_id'],
-            'embedding_dimensions': storage_result['embedding_dimensions'],
-            'search_ready': True,
-            'processing_time': 'immediate',
-            'file_data': file_data  # Add original base64 file data for PDF preview
-        }
+        # Step 1: Extract text straight from the in-memory bytes
+        logger.debug("Extracting text")
+        extraction_result = text_extractor.extract_text_from_bytes(file_content, file_name)
         
-        print(f"Processing completed successfully. Document ready for search.")
+        if not extraction_result.get('success'):
+            return _error_response(500, f"Text extraction failed: {extraction_result.get('error', 'Unknown error')}")
         
-        return {
-            'statusCode': 200,
-            'body': json.dumps(response_data, default=str)
-        }
+        logger.debug("Text extracted: %d words", extraction_result.get('total_words', 0))
+        structured_result = None
+    
+    raw_text = extraction_result.get('raw_text', '')
+    
+    # The file only goes to S3 once its text has been extracted; the upload and
+    # embeddings then run in the background while Claude formats
+    upload_future = None
+    if not existing_s3_key:
+        upload_future = executor.submit(opensearch_client.upload_document,
+                                        file_content, file_name, session_id, content_hash)
+    embeddings_future = executor.submit(opensearch_client.generate_embeddings, raw_text)
+    
+    if structured_result is None:
+        # Step 2: Format with Claude
+        logger.debug("Formatting with Claude")
+        structured_result = claude_client.format_extracted_text(raw_text, document_type)
         
+        if 'error' not in structured_result:
+            with extraction_cache_lock:
+                extraction_cache[cache_key] = (extraction_result, structured_result)
+                if len(extraction_cache) > EXTRACTION_CACHE_SIZE:
+                    extraction_cache.popitem(last=False)
+    
+    if 'error' in structured_result:
+        logger.warning("Claude formatting failed: %s", structured_result['error'])
+        # Continue without structured data
+        structured_data = {}
+        extraction_confidence = 0.5
+    else:
+        structured_data = structured_result
+        extraction_confidence = structured_result.get('confidence', 0.8)
+    
+    logger.debug("Claude formatting completed")
+    
+    # Step 3: Wait for the upload and embeddings, then store in OpenSearch
+    logger.debug("Storing in OpenSearch with embeddings")
+    try:
+        stored_s3_key = existing_s3_key or upload_future.result()
     except Exception as e:
-        print(f"Processing error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'success': False,
-                'error': f'Document processing failed: {str(e)}'
-            })
-        }
\ No newline at end of file
+        return _error_response(500, f"Storage failed: S3 upload failed: {str(e)}")
+    
+    storage_result = opensearch_client.upload_and_store_document(
+        file_content=file_content,
+        filename=file_name,
+        session_id=session_id,
+        raw_text=raw_text,
+        structured_data=structured_data,
+        s3_key=stored_s3_key,
+        embeddings=embeddings_future.result()
+    )
+    
+    if not storage_result['success']:
+        return _error_response(500, f"Storage failed: {storage_result['error']}")
+    
+    logger.debug("Document stored with embeddings: %s", storage_result['document_id'])
+    
+    # Prepare response
+    response_data = {
+        'success': True,
+        'document_name': file_name,
+        'session_id': session_id,
+        'structured_data': structured_data,
+        'raw_text': raw_text,
+        'extraction_confidence': extraction_confidence,
+        'extraction_metadata': extraction_result.get('extraction_metadata', {}),
+        's3_location': storage_result['s3_location'],
+        'document_id': storage_result['document_id'],
+        'embedding_dimensions': storage_result['embedding_dimensions'],
+        'search_ready': True,
+        'processing_time': 'immediate',
+        'file_data': file_data  # Add original base64 file data for PDF preview
+    }
+    
+    logger.info("Processing completed for %s", file_name)
+    
+    return 200, response_data
@@ -22,18 +22,15 @@ const InvoiceProcessor = ({ files, isProcessing, onProcessed, onProcessingComple
       try {
         console.log(`📄 Processing: ${file.name}`);
         
-        // Convert file to base64
-        const fileContent = await fileToBase64(file.file);
-        
-        const requestData = {
-          file_data: fileContent,
-          file_name: file.name,
-          document_type: 'invoice',
-          session_id: sessionId  // Use existing session or let backend create one
-        };
+        // Upload straight to S3, then process by key (base64 is kept for the local preview)
+        const [fileContent, upload] = await Promise.all([
+          fileToBase64(file.file),
+          documentAPI.presignUpload(file.name)
+        ]);
+        await documentAPI.uploadToPresignedUrl(upload.url, file.file);
 
-        // Process the document
-        const result = await documentAPI.processDocument(requestData);
+        // Process the document (use existing session or let backend create one)
+        const result = await documentAPI.processS3Document(upload.s3_key, upload.bucket_name, file.name, sessionId);
         
         if (result.success) {
           console.log(`✅ Successfully processed: ${file.name}`);
@@ -42,15 +42,34 @@ export const documentAPI = {
   },
 
   // Process document from S3
-  processS3Document: async (s3Key, bucketName = null) => {
+  processS3Document: async (s3Key, bucketName = null, fileName = null, sessionId = null) => {
     const response = await api.post('/process-s3-document', {
       s3_key: s3Key,
       bucket_name: bucketName,
+      file_name: fileName,
+      session_id: sessionId,
       document_type: 'invoice'
     });
     return response.data;
   },
 
+  // Get a presigned S3 URL for a direct browser upload
+  presignUpload: async (fileName, contentType = 'application/pdf') => {
+    const response = await api.post('/presign-upload', {
+      file_name: fileName,
+      content_type: contentType
+    });
+    return response.data;
+  },
+
+  // PUT the file straight to S3 so it doesn't pass through the API server
+  uploadToPresignedUrl: async (url, file, contentType = 'application/pdf') => {
+    await axios.put(url, file, {
+      headers: { 'Content-Type': contentType },
+      timeout: 120000
+    });
+  },
+
   // Health check
   healthCheck: async () => {
     const response = await api.get('/health');
@@ -8,7 +8,9 @@ Supports multiple file types and bulk processing.
 import os
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Dict
 
 # Add backend to path so we can import the clients
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
@@ -16,22 +18,65 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 from clients.local_text_extractor import LocalTextExtractor
 from clients.claude_client import ClaudeClient
 
-def test_single_document(file_path: str, text_extractor: LocalTextExtractor, claude_client: ClaudeClient):
-    """Test extraction and formatting for a single document."""
-    print(f"\n{'='*60}")
-    print(f"Testing: {os.path.basename(file_path)}")
-    print(f"{'='*60}")
+# Documents processed at once; bounded to stay within Bedrock request rate limits
+MAX_WORKERS = 8
+
+# Results below this confidence get a second Bedrock call to validate them;
+# set INVOICEABLE_LLM_VALIDATE=1 to validate every result
+VALIDATION_CONFIDENCE_THRESHOLD = 0.6
+ALWAYS_VALIDATE = os.environ.get("INVOICEABLE_LLM_VALIDATE", "0") == "1"
+
+def process_single_document(file_path: str, text_extractor: LocalTextExtractor, claude_client: ClaudeClient) -> Dict[str, Any]:
+    """
+    Run extraction, formatting and validation for a single document.
+    
+    Nothing is printed here so documents can be processed on worker threads;
+    report_single_document prints the outcome afterwards.
+    """
+    outcome = {"file_path": file_path}
     
     try:
         # Step 1: Get file info
-        file_size = os.path.getsize(file_path)
-        file_ext = Path(file_path).suffix.lower()
-        print(f"📄 Loading {file_ext.upper()} file...")
-        print(f"   File size: {file_size:,} bytes")
+        outcome["file_size"] = os.path.getsize(file_path)
+        outcome["file_ext"] = file_ext = Path(file_path).suffix.lower()
         
         # Step 2: Extract text using Local Text Extractor
-        print("🔍 Extracting text with local extractor...")
         extraction_result = text_extractor.extract_text_from_file(file_path)
+        outcome["extraction"] = extraction_result
+        if 'error' in extraction_result:
+            return outcome
+        
+        # Step 3: Format text using Claude (only if it looks like an invoice/document)
+        raw_text = extraction_result.get('raw_text', '')
+        if file_ext in {'.pdf', '.txt'} and len(raw_text.strip()) > 50:
+            formatting_result = claude_client.format_extracted_text(raw_text, "invoice")
+            outcome["formatting"] = formatting_result
+            
+            # Step 4: Validate low-confidence extractions
+            if 'error' not in formatting_result and (
+                ALWAYS_VALIDATE or formatting_result.get('confidence', 0) < VALIDATION_CONFIDENCE_THRESHOLD
+            ):
+                outcome["validation"] = claude_client.validate_extraction(formatting_result, raw_text)
+        
+    except Exception as e:
+        outcome["exception"] = str(e)
+    
+    return outcome
+
+def report_single_document(outcome: Dict[str, Any]) -> bool:
+    """Print the results for a single document; returns whether it succeeded."""
+    file_path = outcome["file_path"]
+    print(f"\n{'='*60}")
+    print(f"Testing: {os.path.basename(file_path)}")
+    print(f"{'='*60}")
+    
+    if "file_size" in outcome:
+        print(f"📄 Loading {outcome['file_ext'].upper()} file...")
+        print(f"   File size: {outcome['file_size']:,} bytes")
+    
+    extraction_result = outcome.get("extraction")
+    if extraction_result is not None:
+        print("🔍 Extracting text with local extractor...")
         
         if 'error' in extraction_result:
             print(f"   ❌ Extraction Error: {extraction_result['error']}")
@@ -50,10 +95,9 @@ def test_single_document(file_path: str, text_extractor: LocalTextExtractor, cla
         raw_text = extraction_result.get('raw_text', '')
         print(f"   📋 First 200 chars: {raw_text[:200]}...")
         
-        # Step 3: Format text using Claude (only if it looks like an invoice/document)
-        if file_ext in {'.pdf', '.txt'} and len(raw_text.strip()) > 50:
+        formatting_result = outcome.get("formatting")
+        if formatting_result is not None:
             print("🤖 Formatting with Claude...")
-            formatting_result = claude_client.format_extracted_text(raw_text, "invoice")
             
             if 'error' in formatting_result:
                 print(f"   ❌ Claude Error: {formatting_result['error']}")
@@ -66,23 +110,22 @@ def test_single_document(file_path: str, text_extractor: LocalTextExtractor, cla
             print("📋 Structured Data:")
             print(json.dumps(formatting_result, indent=2, default=str))
             
-            # Step 4: Validate extraction
-            print("✅ Validating extraction...")
-            validation_result = claude_client.validate_extraction(formatting_result, raw_text)
-            
-            if 'error' not in validation_result:
-                print("📊 Validation Results:")
-                print(json.dumps(validation_result, indent=2, default=str))
-            else:
-                print(f"   ⚠️  Validation error: {validation_result['error']}")
-        else:
+            validation_result = outcome.get("validation")
+            if validation_result is not None:
+                print("✅ Validating extraction...")
+                if 'error' not in validation_result:
+                    print("📊 Validation Results:")
+                    print(json.dumps(validation_result, indent=2, default=str))
+                else:
+                    print(f"   ⚠️  Validation error: {validation_result['error']}")
+        elif "exception" not in outcome:
             print("⏭️  Skipping Claude formatting (not an invoice-type document)")
-        
-        return True
-        
-    except Exception as e:
-        print(f"   💥 Unexpected error: {str(e)}")
+    
+    if "exception" in outcome:
+        print(f"   💥 Unexpected error: {outcome['exception']}")
         return False
+    
+    return True
 
 def test_bulk_processing(text_extractor: LocalTextExtractor, claude_client: ClaudeClient, file_paths: list):
     """Test bulk processing functionality."""
@@ -103,6 +146,30 @@ def test_bulk_processing(text_extractor: LocalTextExtractor, claude_client: Clau
             print(f"   ❌ {file_name}: {result['error']}")
     
     print(f"📊 Bulk extraction: {successful_extractions}/{len(file_paths)} successful")
+    
+    # Format the invoice-type documents together; documents that need the
+    # Sonnet fallback share batched calls instead of one call each
+    invoice_indices = [
+        i for i, result in enumerate(results)
+        if 'error' not in result
+        and Path(file_paths[i]).suffix.lower() in {'.pdf', '.txt'}
+        and len(result.get('raw_text', '').strip()) > 50
+    ]
+    if invoice_indices:
+        print(f"🤖 Formatting {len(invoice_indices)} documents in bulk...")
+        formatted = claude_client.format_batch([results[i]['raw_text'] for i in invoice_indices], "invoice")
+        
+        successful_formats = 0
+        for i, formatting_result in zip(invoice_indices, formatted):
+            file_name = os.path.basename(file_paths[i])
+            if 'error' not in formatting_result:
+                successful_formats += 1
+                print(f"   ✅ {file_name}: {formatting_result.get('model_used', 'unknown')}")
+            else:
+                print(f"   ❌ {file_name}: {formatting_result['error']}")
+        
+        print(f"📊 Bulk formatting: {successful_formats}/{len(invoice_indices)} successful")
+    
     return successful_extractions
 
 def main():
@@ -150,11 +217,17 @@ def main():
     print(f"🔍 INDIVIDUAL DOCUMENT TESTS")
     print(f"{'='*60}")
     
+    # Documents are processed concurrently (the time is almost all Bedrock
+    # round-trips); outcomes are printed here, in order, as they complete
     successful_tests = 0
-    for file_path in document_files:
-        success = test_single_document(file_path, text_extractor, claude_client)
-        if success:
-            successful_tests += 1
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(document_files))) as executor:
+        outcomes = executor.map(
+            lambda file_path: process_single_document(file_path, text_extractor, claude_client),
+            document_files
+        )
+        for outcome in outcomes:
+            if report_single_document(outcome):
+                successful_tests += 1
     
     # Test bulk processing
     if len(document_files) > 1:
@@ -0,0 +1,56 @@
+import io
+import unittest
+from unittest import mock
+
+from botocore.response import StreamingBody
+
+import api_server
+from backend.lambda_functions import document_processor
+
+INVOICE_TEXT = b"INVOICE\nAcme Widgets LLC\nInvoice Number: 1001\nTotal: $250.00\n"
+
+
+class UploadThenChatTest(unittest.TestCase):
+    def setUp(self):
+        document_processor._ensure_clients()
+        store = api_server.opensearch_client
+
+        s3_client = mock.MagicMock()
+        s3_client.head_object.return_value = {"ContentLength": len(INVOICE_TEXT), "ETag": '"etag"'}
+        s3_client.get_object.side_effect = lambda **kwargs: {
+            "Body": StreamingBody(io.BytesIO(INVOICE_TEXT), len(INVOICE_TEXT))
+        }
+        structured = {"vendor_name": "Acme Widgets LLC", "total_amount": 250.0, "confidence": 0.9}
+
+        for patcher in (
+            mock.patch.object(store, "s3_client", s3_client),
+            mock.patch.object(store, "generate_embeddings", return_value=[1.0, 0.0]),
+            mock.patch.object(document_processor.claude_client, "format_extracted_text", return_value=structured),
+            mock.patch.object(api_server.chat_handler.claude_client, "stream_chat", return_value=iter(["Acme billed $250."])),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_streamed_chat_sees_document_stored_by_processor(self):
+        self.assertIs(document_processor.opensearch_client, api_server.chat_handler.opensearch_client)
+
+        response = api_server.process_s3_document(api_server.S3DocumentRequest(
+            s3_key="uploads/invoice.txt", file_name="invoice.txt", session_id="session-1"
+        ))
+        self.assertTrue(response["success"])
+
+        chunks = list(api_server.chat_handler.stream_chat("Who billed us?", "session-1"))
+        self.assertEqual(chunks, ["Acme billed $250."])
+
+    def test_chat_endpoint_searches_by_session_id(self):
+        with mock.patch.object(api_server.session_manager, "get_session", return_value={"session_id": "session-2"}), \
+                mock.patch.object(api_server.chat_handler, "handle_chat",
+                                  return_value={"success": True, "response": "ok"}) as handle_chat:
+            response = api_server.chat_with_invoices(api_server.ChatRequest(session_id="session-2", message="Totals?"))
+
+        handle_chat.assert_called_once_with("Totals?", "session-2")
+        self.assertEqual(response["response"], "ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import io
+import unittest
+from unittest import mock
+
+import orjson
+
+from backend.clients import claude_client as claude_module
+from backend.clients.claude_client import ClaudeClient
+
+COMPLETE_HEADER = (
+    "INVOICE\nCCS Disaster Recovery Services LLC\nInvoice Number: 6792\n"
+    "Invoice Date: June 1, 2025\nServices 1 $3,420.00 $3,420.00\nTotal: $3,420.00\n"
+)
+
+
+def nova_reply(payload):
+    return {"output": {"message": {"content": [{"text": orjson.dumps(payload).decode()}]}}}
+
+
+class FakeBedrock:
+    """Stands in for the bedrock-runtime client, replying from a handler per call."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+    def invoke_model(self, modelId, body):
+        request = orjson.loads(body)
+        self.requests.append((modelId, request))
+        return {"body": io.BytesIO(orjson.dumps(self.handler(modelId, request)))}
+
+
+class FormatExtractedTextTest(unittest.TestCase):
+    def setUp(self):
+        claude_module._response_cache.clear()
+        self.client = ClaudeClient()
+        self.client.llm_cache.enabled = False
+
+    def use_bedrock(self, handler):
+        bedrock = FakeBedrock(handler)
+        patcher = mock.patch.object(self.client, "client", bedrock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return bedrock
+
+    def test_complete_rule_fields_still_call_the_model_for_line_items(self):
+        line_items = [{"description": "Disaster Recovery", "quantity": 1, "rate": 3420.0, "amount": 3420.0}]
+        bedrock = self.use_bedrock(lambda model_id, request: nova_reply({
+            "vendor_name": "CCS Disaster Recovery Services LLC", "total_amount": 3420.0, "line_items": line_items
+        }))
+
+        result = self.client.format_extracted_text(COMPLETE_HEADER)
+
+        self.assertEqual(len(bedrock.requests), 1)
+        prompt = bedrock.requests[0][1]["messages"][0]["content"][0]["text"]
+        self.assertIn('"invoice_number":"6792"', prompt)
+        self.assertEqual(result["line_items"], line_items)
+        self.assertEqual(result["model_used"], "nova-lite")
+        # Fields the model left out come from the rule extractor
+        self.assertEqual(result["date"], "2025-06-01")
+
+
+class SpeculativeSonnetTest(FormatExtractedTextTest):
+    TEXT = "Some loosely structured billing text for the period."
+
+    def handler(self, nova_replies):
+        """Nova Lite answers from nova_replies in turn; Sonnet always answers with its tool call."""
+        replies = iter(nova_replies)
+
+        def reply(model_id, request):
+            if "nova" in model_id:
+                return {"output": {"message": {"content": [{"text": next(replies)}]}}}
+            tool_input = {"vendor_name": "Sonnet Vendor LLC", "total_amount": 10.0}
+            return {"content": [{"type": "tool_use", "name": request["tool_choice"]["name"], "input": tool_input}]}
+
+        return reply
+
+    def test_sonnet_result_is_used_when_nova_retries_fail(self):
+        bedrock = self.use_bedrock(self.handler(["not json"] * 3))
+
+        result = self.client.format_extracted_text(self.TEXT)
+
+        self.assertEqual(result["model_used"], "claude-3.5-sonnet")
+        self.assertEqual(result["vendor_name"], "Sonnet Vendor LLC")
+        models = [model_id for model_id, _ in bedrock.requests]
+        self.assertEqual(models.count(self.client.fallback_model_id), 1)
+
+    def test_successful_nova_retry_wins_over_speculative_sonnet(self):
+        retry = orjson.dumps({"vendor_name": "Nova Vendor LLC", "total_amount": 5.0}).decode()
+        self.use_bedrock(self.handler(["not json", retry]))
+
+        result = self.client.format_extracted_text(self.TEXT)
+
+        self.assertEqual(result["model_used"], "nova-lite")
+        self.assertEqual(result["vendor_name"], "Nova Vendor LLC")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import base64
+import unittest
+from unittest import mock
+
+from backend.lambda_functions import document_processor
+
+
+class FailedExtractionTest(unittest.TestCase):
+    def setUp(self):
+        document_processor._ensure_clients()
+
+    def test_nothing_is_uploaded_when_extraction_fails(self):
+        body = {
+            "file_data": base64.b64encode(b"not really a pdf").decode(),
+            "file_name": "broken.pdf",
+            "session_id": "session-1",
+        }
+        with mock.patch.object(document_processor.opensearch_client, "upload_document") as upload_document:
+            status_code, response = document_processor.handle_document_request(body)
+
+        self.assertEqual(status_code, 500)
+        self.assertIn("Text extraction failed", response["error"])
+        upload_document.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import hashlib
+import unittest
+from unittest import mock
+
+from s3transfer.manager import TransferManager
+
+from backend.clients.aws_clients import TRANSFER_CONFIG
+from backend.clients.opensearch_client import OpenSearchClient
+
+LARGE_OBJECT = b"x" * TRANSFER_CONFIG.multipart_threshold
+
+
+def fake_download_fileobj(bucket, key, fileobj, ExtraArgs=None, Config=None):
+    """Mimic s3transfer's argument validation, then write the object."""
+    for arg in ExtraArgs or {}:
+        if arg not in TransferManager.ALLOWED_DOWNLOAD_ARGS:
+            raise ValueError(f"Invalid extra_args key '{arg}'")
+    fileobj.write(LARGE_OBJECT)
+
+
+class DownloadDocumentTest(unittest.TestCase):
+    def setUp(self):
+        self.client = OpenSearchClient()
+        self.s3_client = mock.MagicMock()
+        self.s3_client.download_fileobj.side_effect = fake_download_fileobj
+        patcher = mock.patch.object(self.client, "s3_client", self.s3_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_multipart_download_of_unversioned_object(self):
+        self.s3_client.head_object.return_value = {"ContentLength": len(LARGE_OBJECT), "ETag": '"abc"'}
+
+        content, content_hash, etag = self.client.download_document("uploads/big.pdf")
+
+        self.assertEqual(content, LARGE_OBJECT)
+        self.assertEqual(content_hash, hashlib.blake2b(LARGE_OBJECT, digest_size=16).hexdigest())
+        self.assertEqual(etag, '"abc"')
+        self.s3_client.get_object.assert_not_called()
+        # The ETag is re-checked after the download
+        self.assertEqual(self.s3_client.head_object.call_count, 2)
+
+    def test_multipart_download_pins_version(self):
+        self.s3_client.head_object.return_value = {
+            "ContentLength": len(LARGE_OBJECT), "ETag": '"abc"', "VersionId": "v1"
+        }
+
+        self.client.download_document("uploads/big.pdf")
+
+        self.assertEqual(self.s3_client.download_fileobj.call_args.kwargs["ExtraArgs"], {"VersionId": "v1"})
+        self.assertEqual(self.s3_client.head_object.call_count, 1)
+
+    def test_multipart_download_rejects_object_changed_mid_download(self):
+        self.s3_client.head_object.side_effect = [
+            {"ContentLength": len(LARGE_OBJECT), "ETag": '"abc"'},
+            {"ContentLength": len(LARGE_OBJECT), "ETag": '"def"'},
+        ]
+
+        with self.assertRaises(RuntimeError):
+            self.client.download_document("uploads/big.pdf")
+
+
+if __name__ == "__main__":
+    unittest.main()
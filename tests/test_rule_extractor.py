@@ -0,0 +1,27 @@
+import unittest
+
+from backend.clients.rule_extractor import RuleExtractor
+
+
+class RuleExtractorTest(unittest.TestCase):
+    def setUp(self):
+        self.extractor = RuleExtractor()
+
+    def test_vendor_is_a_whole_company_name_line(self):
+        fields = self.extractor.extract_fields("INVOICE\nCCS Disaster Recovery Services LLC\n3197 Airport Loop Dr.")
+        self.assertEqual(fields["vendor_name"], "CCS Disaster Recovery Services LLC")
+
+    def test_address_line_ending_in_suffix_is_not_a_vendor(self):
+        fields = self.extractor.extract_fields("Bill To\nPomona, CA  91761 Sability, LP\n12545 Silver Fox Ct.")
+        self.assertNotIn("vendor_name", fields)
+
+    def test_due_date_is_not_the_invoice_date(self):
+        fields = self.extractor.extract_fields("Terms Net 30 Due Date 6/30/2025\nInvoice Date: 5/31/2025")
+        self.assertEqual(fields["date"], "2025-05-31")
+
+    def test_date_label_must_start_a_word(self):
+        self.assertNotIn("date", self.extractor.extract_fields("Update: 1/2/2024"))
+
+
+if __name__ == "__main__":
+    unittest.main()